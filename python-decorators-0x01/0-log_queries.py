@@ -1,25 +1,11 @@
 import sqlite3
-import functools
 
-from datetime import datetime
-
-
-# Decorator to log SQL queries
-def log_queries(func):
-    """
-    Decorator that logs SQL queries before executing them.
-    Assumes the first argument of the decorated function
-    is a 'query' parameter.
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        query = kwargs.get('query') or (args[0] if args else '')
-        print(f"[{datetime.now()}] Executing SQL query: {query}")
-        return func(*args, **kwargs)
-    return wrapper
+from query_trace import log_queries
+from query_stats import collect_stats
 
 
 @log_queries
+@collect_stats
 def fetch_all_users(query):
     """
     Fetch all users from the database.
@@ -1,25 +1,6 @@
 """Handle Database Connections with a Decorator"""
-import sqlite3
-import functools
 
-
-def with_db_connection(func):
-    """
-    Decorator that manages a SQLite database connection.
-
-    It opens a connection to 'users.db',
-    passes it to the decorated function as the
-    first argument, and ensures the connection is closed afterward,
-    regardless of success or error.
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
+from db_connection import with_db_connection
 
 
 @with_db_connection
@@ -1,44 +1,6 @@
 """Transaction Management Decorator"""
-import sqlite3
-import functools
 
-
-def with_db_connection(func):
-    """
-    Decorator that manages a SQLite database connection.
-
-    It opens a connection to 'users.db',
-    passes it to the decorated function as the
-    first argument, and ensures the connection is closed afterward,
-    regardless of success or error.
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
-
-
-def transactional(func):
-    """
-    Decorator that wraps a database operation inside a transaction.
-
-    It commits the transaction if the function executes successfully,
-    otherwise it rolls back in case of an exception.
-    """
-    @functools.wraps(func)
-    def wrapper(conn, *args, **kwargs):
-        try:
-            result = func(conn, *args, **kwargs)
-            conn.commit()
-            return result
-        except Exception as e:
-            conn.rollback()
-            raise e
-    return wrapper
+from db_connection import with_db_connection, transactional
 
 
 @with_db_connection
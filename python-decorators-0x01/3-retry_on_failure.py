@@ -1,53 +1,13 @@
 """Using Decorators to retry database queries"""
-import time
-import sqlite3
-import functools
+from db_connection import with_db_connection
+from retry_policy import retry_on_failure
+from circuit_breaker import CircuitBreaker, circuit_breaker
 
-
-def with_db_connection(func):
-    """
-    Decorator that manages a SQLite database connection.
-
-    It opens a connection to 'users.db', passes it to the decorated function as the
-    first argument, and ensures the connection is closed afterward, regardless of success or error.
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
-
-
-def retry_on_failure(retries=3, delay=2):
-    """
-    Decorator that retries a function if it raises an exception.
-
-    Parameters:
-    - retries: number of retry attempts
-    - delay: delay in seconds between attempts
-    """
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            attempt = 0
-            while attempt < retries:
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    attempt += 1
-                    print(f"Attempt {attempt} failed: {e}")
-                    if attempt < retries:
-                        time.sleep(delay)
-                    else:
-                        print("Max retry attempts reached.")
-                        raise
-        return wrapper
-    return decorator
+# Stops calls to users.db for a while once most of them fail
+users_db_breaker = CircuitBreaker("users.db")
 
 
+@circuit_breaker(users_db_breaker)
 @with_db_connection
 @retry_on_failure(retries=3, delay=1)
 def fetch_users_with_retry(conn):
@@ -0,0 +1,206 @@
+"""Circuit breaker that fails fast while the database keeps failing"""
+import time
+import inspect
+import functools
+import threading
+from collections import deque
+
+from retry_policy import is_unavailable
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the function while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of recent calls and stops calls while they fail.
+
+    Closed: calls go through; once at least min_calls of the last window
+    calls ended and failure_rate of them failed, the circuit opens.
+    Open: calls fail at once with CircuitOpenError for reset_timeout
+    seconds. Half-open: up to trial_calls calls are let through; if they
+    all succeed the circuit closes, and the first failure opens it again.
+
+    Only exceptions for which is_failure returns True count as failures;
+    by default those of retry_policy.is_unavailable (transient errors, a
+    missing database file or schema), so a syntax error does not take a
+    healthy database offline. A call ended
+    by a BaseException such as a cancellation or KeyboardInterrupt says
+    nothing about the database: it is not counted and gives its trial
+    slot back.
+    """
+
+    def __init__(self, name="users.db", failure_rate=0.5, window=20,
+                 min_calls=10, reset_timeout=30.0, trial_calls=3,
+                 is_failure=None):
+        """
+        Args:
+            name (str): Name used in errors and metrics.
+            failure_rate (float): Fraction of failed calls that opens it.
+            window (int): Number of recent calls considered.
+            min_calls (int): Calls needed before the rate is trusted.
+            reset_timeout (float): Seconds the circuit stays open.
+            trial_calls (int): Calls allowed through when half-open.
+            is_failure (callable): Whether an exception counts as a failure.
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.trial_calls = trial_calls
+        self.is_failure = is_failure or is_unavailable
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)  # True for a failure
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_successes = 0
+        self._period = 0  # number of the current half-open period
+        self._lock = threading.Lock()
+        self._metrics = {"calls": 0, "failures": 0, "rejected": 0,
+                         "transitions": {}}
+        self.transitions = deque(maxlen=100)  # (time, from, to)
+
+    def before_call(self):
+        """
+        Admit one call or raise CircuitOpenError.
+
+        Returns:
+            int: For a half-open trial the number of its half-open period,
+                which is never 0; otherwise 0.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._metrics["rejected"] += 1
+                    raise CircuitOpenError(f"Circuit {self.name} is open")
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trials >= self.trial_calls:
+                    self._metrics["rejected"] += 1
+                    raise CircuitOpenError(
+                        f"Circuit {self.name} is half-open, trials in flight")
+                self._trials += 1
+            self._metrics["calls"] += 1
+            return self._period if self.state == HALF_OPEN else 0
+
+    def on_success(self, trial):
+        """Record a call that succeeded."""
+        with self._lock:
+            if trial:
+                if not self._current(trial):
+                    return
+                self._trial_successes += 1
+                if self._trial_successes >= self.trial_calls:
+                    self._transition(CLOSED)
+            elif self.state == CLOSED:
+                self._outcomes.append(False)
+
+    def on_failure(self, trial):
+        """Record a call that failed."""
+        with self._lock:
+            self._metrics["failures"] += 1
+            if trial:
+                if self._current(trial):
+                    self._transition(OPEN)
+                return
+            if self.state != CLOSED:
+                return
+            self._outcomes.append(True)
+            if len(self._outcomes) >= self.min_calls and \
+                    sum(self._outcomes) / len(self._outcomes) \
+                    >= self.failure_rate:
+                self._transition(OPEN)
+
+    def on_abort(self, trial):
+        """Give back the slot of a call that ended without an outcome."""
+        with self._lock:
+            if trial and self._current(trial):
+                self._trials -= 1
+
+    def call(self, func, *args, **kwargs):
+        """Call func through the breaker."""
+        trial = self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.on_failure(trial)
+            else:
+                self.on_success(trial)
+            raise
+        except BaseException:
+            self.on_abort(trial)
+            raise
+        self.on_success(trial)
+        return result
+
+    async def call_async(self, func, *args, **kwargs):
+        """Await coroutine function func through the breaker."""
+        trial = self.before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.on_failure(trial)
+            else:
+                self.on_success(trial)
+            raise
+        except BaseException:
+            self.on_abort(trial)
+            raise
+        self.on_success(trial)
+        return result
+
+    def stats(self):
+        """Return the state, call counters and state change counts."""
+        with self._lock:
+            stats = dict(self._metrics, state=self.state)
+            stats["transitions"] = dict(self._metrics["transitions"])
+        return stats
+
+    def _current(self, trial):
+        """Whether trial belongs to the ongoing half-open period."""
+        return self.state == HALF_OPEN and trial == self._period
+
+    def _transition(self, state):
+        """Move to state; caller holds the lock."""
+        change = f"{self.state}->{state}"
+        transitions = self._metrics["transitions"]
+        transitions[change] = transitions.get(change, 0) + 1
+        self.transitions.append((time.time(), self.state, state))
+        print(f"Circuit {self.name}: {change}")
+        self.state = state
+        self._outcomes.clear()
+        self._trials = 0
+        self._trial_successes = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._period += 1
+
+
+def circuit_breaker(breaker):
+    """
+    Decorator that calls the function through breaker.
+
+    Put it outermost, above with_db_connection and retry_on_failure: an
+    open circuit then fails before a connection is checked out or any
+    retry is slept, and one exhausted retry sequence counts as one failure.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await breaker.call_async(func, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return breaker.call(func, *args, **kwargs)
+        return wrapper
+    return decorator
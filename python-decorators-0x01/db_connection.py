@@ -0,0 +1,383 @@
+"""Shared SQLite connection pool, with_db_connection and transactional"""
+import os
+import time
+import asyncio
+import inspect
+import sqlite3
+import weakref
+import functools
+import threading
+from urllib.request import pathname2url
+
+import query_cache
+
+# Prepared statements each connection keeps compiled
+STATEMENT_CACHE_SIZE = 256
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Async pools per event loop, then per database path
+_async_pools = weakref.WeakKeyDictionary()
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection is released in time."""
+
+
+def database_path():
+    """Database used when none is given: USERS_DB_PATH, or 'users.db'."""
+    return os.getenv('USERS_DB_PATH', 'users.db')
+
+
+def connect(path=None):
+    """
+    Open a tuned SQLite connection.
+
+    WAL lets readers run alongside a writer, synchronous=NORMAL skips the
+    fsync on every commit (still safe in WAL mode), and the statement cache
+    keeps compiled queries around for as long as the connection lives.
+    The database must exist: a missing file raises "unable to open
+    database file" instead of being created empty.
+    """
+    path = path or database_path()
+    conn = sqlite3.connect(_existing(path), uri=True, factory=_Connection,
+                           check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.database = _database_name(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class _Connection(sqlite3.Connection):
+    """sqlite3 connection that remembers the database it was opened on."""
+
+    database = None
+
+
+def _database_name(path):
+    """Absolute path of a database file, or path itself for ':memory:'."""
+    if path == ':memory:' or path.startswith('file:'):
+        return path
+    return os.path.abspath(path)
+
+
+def _existing(path):
+    """URI opening the database file at path only if it already exists."""
+    if path == ':memory:' or path.startswith('file:'):
+        return path
+    return f"file:{pathname2url(os.path.abspath(path))}?mode=rw"
+
+
+class ConnectionPool:
+    """
+    A bounded pool of connections to one database file.
+
+    At most size connections are open at once; acquire() waits up to
+    timeout seconds for one to be released when they are all in use.
+    Idle connections are reused most recently released first, so their
+    statement caches stay warm.
+    """
+
+    def __init__(self, path, size=5, timeout=30.0):
+        """
+        Args:
+            path (str): SQLite database file.
+            size (int): Maximum number of open connections.
+            timeout (float): Seconds acquire() waits for a connection.
+        """
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle = []  # most recently released last
+        self._open = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Check a connection out of the pool, opening one if allowed."""
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"No connection to {self.path} released within "
+                        f"{self.timeout}s")
+                self._condition.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return connect(self.path)
+        except Exception:
+            self._drop()
+            raise
+
+    def release(self, conn):
+        """
+        Return a connection to the pool.
+
+        A transaction left open is rolled back first; a connection that was
+        closed or broke is dropped, freeing its slot. Either way one waiter
+        is woken.
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            self._drop()
+            return
+        with self._condition:
+            self._idle.append(conn)
+            self._condition.notify()
+
+    def close(self):
+        """Close the idle connections."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._condition.notify(len(idle))
+        for conn in idle:
+            conn.close()
+
+    def _drop(self):
+        """Free the slot of a connection that is gone and wake a waiter."""
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+
+def get_pool(path=None):
+    """
+    Return the process-wide pool for path, creating it on first use.
+
+    Pools hold USERS_DB_POOL_SIZE connections (default 5). A forked child
+    gets pools of its own instead of sharing its parent's connections.
+    """
+    path = path or database_path()
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None or pool.pid != os.getpid():
+            pool = ConnectionPool(
+                path, size=int(os.getenv('USERS_DB_POOL_SIZE', '5')))
+            _pools[path] = pool
+        return pool
+
+
+class AsyncConnectionPool:
+    """
+    A bounded pool of aiosqlite connections, used from one event loop.
+
+    Same policy as ConnectionPool: at most size connections, reused most
+    recently released first, tuned by the same PRAGMAs.
+    """
+
+    def __init__(self, path, size=5):
+        self.path = path
+        self.size = size
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        self._closed = False
+
+    async def acquire(self):
+        """Check a connection out of the pool, opening one if needed."""
+        await self._slots.acquire()
+        if self._idle:
+            return self._idle.pop()
+        try:
+            return await async_connect(self.path)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, conn):
+        """Return a connection, rolling back or dropping it as needed."""
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+            if self._closed:
+                await conn.close()
+                return
+        except (sqlite3.Error, ValueError):
+            await _close_quietly(conn)
+        else:
+            self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        """Close the idle connections, and the others once released."""
+        self._closed = True
+        while self._idle:
+            await self._idle.pop().close()
+
+
+async def async_connect(path=None):
+    """Open a tuned aiosqlite connection (see connect)."""
+    import aiosqlite
+
+    path = path or database_path()
+    conn = await aiosqlite.connect(_existing(path), uri=True,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+    conn.database = _database_name(path)
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+async def _close_quietly(conn):
+    """Close a connection that may already be broken."""
+    try:
+        await conn.close()
+    except Exception:
+        pass
+
+
+async def get_async_pool(path=None):
+    """
+    Return the pool for path of the running event loop.
+
+    The pools of a loop are closed when it shuts down its async generators,
+    as asyncio.run() does before returning. aiosqlite runs each connection
+    in a non-daemon thread, so an idle connection left open would keep the
+    process from exiting; loops driven by hand must call
+    close_async_pools() before they stop.
+    """
+    path = path or database_path()
+    loop = asyncio.get_running_loop()
+    if loop not in _async_pools:
+        watcher = _close_at_shutdown()
+        # Runs up to its yield, registering it with the loop
+        pools = await watcher.__anext__()
+        _async_pools[loop] = (pools, watcher)
+    pools = _async_pools[loop][0]
+    pool = pools.get(path)
+    if pool is None:
+        pool = pools[path] = AsyncConnectionPool(
+            path, size=int(os.getenv('USERS_DB_POOL_SIZE', '5')))
+    return pool
+
+
+async def _close_at_shutdown():
+    """
+    Async generator holding the pools of a loop; the loop closes it at
+    shutdown, and its finally clause closes the pools.
+    """
+    pools = {}
+    try:
+        yield pools
+    finally:
+        while pools:
+            await pools.popitem()[1].close()
+
+
+async def close_async_pools():
+    """Close every connection pool of the running event loop."""
+    entry = _async_pools.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[1].aclose()
+
+
+def with_db_connection(func=None, *, path=None):
+    """
+    Decorator that provides a pooled SQLite database connection.
+
+    It checks a connection out of the shared pool, passes it to the
+    decorated function as the first argument, and returns it to the pool
+    afterward, regardless of success or error. Use it bare, or as
+    @with_db_connection(path='other.db') for another database.
+
+    Coroutine functions get an aiosqlite connection from a pool of the
+    running event loop instead.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                pool = await get_async_pool(path)
+                conn = await pool.acquire()
+                try:
+                    return await func(conn, *args, **kwargs)
+                finally:
+                    await pool.release(conn)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            pool = get_pool(path)
+            conn = pool.acquire()
+            try:
+                return func(conn, *args, **kwargs)
+            finally:
+                pool.release(conn)
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+def transactional(func=None, *, cache=None):
+    """
+    Decorator that wraps a database operation inside a transaction.
+
+    It commits the transaction if the function executes successfully,
+    otherwise it rolls back in case of an exception. After a commit, the
+    cached results of queries reading the tables it wrote are dropped
+    from cache (default: query_cache.default_cache). Coroutine functions
+    get the same behaviour on an aiosqlite connection.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(conn, *args, **kwargs):
+                written = set()
+                await conn.set_trace_callback(_written_tables(written))
+                try:
+                    result = await func(conn, *args, **kwargs)
+                    await conn.commit()
+                except Exception as e:
+                    await conn.rollback()
+                    raise e
+                finally:
+                    await conn.set_trace_callback(None)
+                if written:
+                    store = query_cache.default_cache if cache is None \
+                        else cache
+                    store.invalidate(written)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            written = set()
+            conn.set_trace_callback(_written_tables(written))
+            try:
+                result = func(conn, *args, **kwargs)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise e
+            finally:
+                conn.set_trace_callback(None)
+            if written:
+                store = query_cache.default_cache if cache is None else cache
+                store.invalidate(written)
+            return result
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+def _written_tables(written):
+    """Trace callback adding the tables written by each statement to written."""
+    def record(statement):
+        table = query_cache.table_written(statement)
+        if table is not None:
+            written.add(table)
+    return record
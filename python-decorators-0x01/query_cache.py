@@ -0,0 +1,475 @@
+"""Bounded LRU/TTL cache of query results, invalidated by table"""
+import re
+import sys
+import time
+import asyncio
+import inspect
+import sqlite3
+import functools
+import threading
+from collections import OrderedDict
+
+# Tables a query reads from
+READ_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+["`\[]?(\w+)', re.IGNORECASE)
+
+# Table a write statement changes
+WRITTEN_TABLE = re.compile(
+    r'^\s*(?:(?:INSERT|REPLACE)(?:\s+OR\s+\w+)?\s+INTO'
+    r'|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+["`\[]?(\w+)',
+    re.IGNORECASE)
+
+# Statements that never change a table; any other statement is a write
+READ_STATEMENT = re.compile(
+    r'^\s*(?:SELECT|VALUES|EXPLAIN|PRAGMA|BEGIN|COMMIT|END|ROLLBACK'
+    r'|SAVEPOINT|RELEASE)\b',
+    re.IGNORECASE)
+
+# Comments and whitespace before the first keyword of a statement
+LEADING_COMMENTS = re.compile(r'^(?:\s+|--[^\n]*|/\*.*?\*/)*', re.DOTALL)
+
+# Common table expressions, before the statement that uses them
+WITH_CLAUSE = re.compile(r'^WITH\b', re.IGNORECASE)
+
+# Tokens of a WITH clause: literals, quoted names and comments are skipped
+# whole, so parentheses and keywords inside them are not counted
+_TOKEN = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]"
+    r"|--[^\n]*|/\*.*?\*/|[()]|\w+",
+    re.DOTALL)
+
+# Keywords starting the statement that follows a WITH clause
+_MAIN_KEYWORDS = {'select', 'values', 'insert', 'replace', 'update', 'delete'}
+
+# Tag of entries whose tables could not be parsed: any write drops them
+ANY_TABLE = '*'
+
+# Marks a cache miss, since None is a valid query result
+_MISSING = object()
+
+# Result of a load whose leader was cancelled: a waiter takes it over
+_ABANDONED = object()
+
+
+def tables_read(query):
+    """Lowercased names of the tables query reads, or {ANY_TABLE}."""
+    tables = {name.lower() for name in READ_TABLES.findall(query or '')}
+    return tables or {ANY_TABLE}
+
+
+def table_written(statement):
+    """
+    Lowercased name of the table a write statement changes.
+
+    A WITH clause is skipped to classify the statement that follows it.
+    Statements that are neither known reads nor attributable writes are
+    assumed to write anything.
+
+    Returns:
+        str: The table, ANY_TABLE for writes that cannot be attributed to
+        one table (DDL and unknown statements), or None if statement does
+        not write.
+    """
+    statement = LEADING_COMMENTS.sub('', statement, count=1)
+    if WITH_CLAUSE.match(statement):
+        statement = _main_statement(statement)
+    if READ_STATEMENT.match(statement):
+        return None
+    match = WRITTEN_TABLE.match(statement)
+    return match.group(1).lower() if match else ANY_TABLE
+
+
+def _main_statement(statement):
+    """The statement after a WITH clause, or statement if none is found."""
+    depth = 0
+    for token in _TOKEN.finditer(statement):
+        text = token.group()
+        if text == '(':
+            depth += 1
+        elif text == ')':
+            depth -= 1
+        elif depth == 0 and text.lower() in _MAIN_KEYWORDS:
+            return statement[token.start():]
+    return statement
+
+
+def approx_size(value):
+    """Approximate size of a query result in bytes."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(approx_size(item) for item in value)
+    return size
+
+
+class QueryCache:
+    """
+    A thread-safe LRU cache of query results with a per-entry TTL.
+
+    Entries are evicted least recently used first once there are more than
+    max_entries of them, or once their total approximate size exceeds
+    max_bytes. Each entry remembers the tables its query reads, so a write
+    to a table drops exactly the results that depend on it.
+
+    get_or_load() coalesces concurrent misses on the same key: one caller
+    runs the query while the others wait for its result; get_or_load_async()
+    does the same for coroutines. The internal lock is only held for
+    dictionary updates, never across a query or an await, so the cache is
+    safe to share between threads and event loops.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None, ttl=300.0):
+        """
+        Args:
+            max_entries (int): Maximum number of cached results.
+            max_bytes (int): Maximum total approximate size, or None.
+            ttl (float): Default seconds an entry stays valid, or None
+                for no expiry.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key: (value, expires, size, tables)
+        self._bytes = 0
+        self._generation = 0  # bumped by every invalidation
+        self._lock = threading.Lock()
+        self._inflight = {}  # key: _Flight of the caller running the query
+        self._async_inflight = {}  # (loop, key): future of the leader
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, key, default=None):
+        """Return the live entry for key, counting a hit or a miss."""
+        with self._lock:
+            return self._lookup(key, default)
+
+    def get_or_load(self, key, load, ttl=None):
+        """
+        Return the entry for key, running load() once to fill it on a miss.
+
+        Concurrent callers that miss on the same key wait for the first
+        one's load() instead of running it too. If it raises, every waiter
+        gets the same exception and nothing is cached, so the next call
+        tries again. If it is interrupted instead (KeyboardInterrupt,
+        SystemExit), one of the waiters takes the load over.
+
+        Returns:
+            tuple: The value, and how it was obtained: "hit", "coalesced"
+                (shared with an in-flight load) or "loaded".
+        """
+        while True:
+            with self._lock:
+                value = self._lookup(key, _MISSING)
+                if value is not _MISSING:
+                    return value, "hit"
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight()
+                    since = self._generation
+                else:
+                    self._stats["coalesced"] += 1
+
+            if leader:
+                break
+            flight.done.wait()
+            if flight.error is None:
+                return flight.value, "coalesced"
+            if isinstance(flight.error, Exception):
+                raise flight.error
+
+        try:
+            flight.value = load()
+            self.put(key, flight.value, ttl=ttl, since=since)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+        return flight.value, "loaded"
+
+    @property
+    def generation(self):
+        """Number of invalidations so far; pass it to put() as since."""
+        return self._generation
+
+    def put(self, key, value, tables=None, ttl=None, since=None):
+        """
+        Cache value under key, evicting the least recently used entries.
+
+        Args:
+            key (tuple): Query text, parameters and scope (see cache_key).
+            value: Query result.
+            tables (set): Tables the result depends on, parsed from the
+                query in key[0] by default.
+            ttl (float): Seconds the entry stays valid, defaults to the
+                cache ttl.
+            since (int): generation read before running the query; if an
+                invalidation happened since, the result may already be
+                stale and is not cached.
+        """
+        if tables is None:
+            tables = tables_read(key[0])
+        ttl = self.ttl if ttl is None else ttl
+        expires = None if ttl is None else time.monotonic() + ttl
+        size = approx_size(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if since is not None and since != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires, size, frozenset(tables))
+            self._bytes += size
+            while self._entries and (
+                    len(self._entries) > self.max_entries
+                    or (self.max_bytes is not None
+                        and self._bytes > self.max_bytes)):
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, tables):
+        """Drop the entries that read any of tables (or ANY_TABLE)."""
+        tables = {table.lower() for table in tables}
+        with self._lock:
+            if ANY_TABLE in tables:
+                stale = list(self._entries)
+            else:
+                stale = [key for key, entry in self._entries.items()
+                         if entry[3] & tables or ANY_TABLE in entry[3]]
+            for key in stale:
+                self._remove(key)
+            self._stats["invalidations"] += len(stale)
+            self._generation += 1
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return the counters, entry count, size and hit ratio."""
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries),
+                         bytes=self._bytes)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    async def get_or_load_async(self, key, load, ttl=None):
+        """
+        Coroutine version of get_or_load: load is an async callable, and
+        waiters await the leader's future instead of blocking the loop.
+        If the leader is cancelled, one of the waiters takes the load over.
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        while True:
+            with self._lock:
+                value = self._lookup(key, _MISSING)
+                if value is not _MISSING:
+                    return value, "hit"
+                future = self._async_inflight.get(flight_key)
+                leader = future is None
+                if leader:
+                    future = loop.create_future()
+                    self._async_inflight[flight_key] = future
+                    since = self._generation
+                else:
+                    self._stats["coalesced"] += 1
+
+            if leader:
+                break
+            # shield: a cancelled waiter must not cancel the shared query
+            value = await asyncio.shield(future)
+            if value is not _ABANDONED:
+                return value, "coalesced"
+
+        try:
+            value = await load()
+            self.put(key, value, ttl=ttl, since=since)
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here so an unawaited failure is not reported
+            future.exception()
+            raise
+        except BaseException:
+            future.set_result(_ABANDONED)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._lock:
+                del self._async_inflight[flight_key]
+        return value, "loaded"
+
+    def _lookup(self, key, default):
+        """Return the live entry for key or default; caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None \
+                and entry[1] <= time.monotonic():
+            self._remove(key)
+            self._stats["expirations"] += 1
+            entry = None
+        if entry is None:
+            self._stats["misses"] += 1
+            return default
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return entry[0]
+
+    def _remove(self, key):
+        """Remove key; caller holds the lock."""
+        self._bytes -= self._entries.pop(key)[2]
+
+
+class _Flight:
+    """A query being run by one caller on behalf of every waiter."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Cache shared by cache_query and invalidated by transactional
+default_cache = QueryCache()
+
+
+def cache_key(args, kwargs, scope=()):
+    """
+    Key of a call to a cached query function: its query, its parameters
+    and scope, which tells apart the same SQL run by other functions or
+    against other databases.
+
+    The query is the 'query' keyword argument or the first positional one;
+    every other argument counts as a parameter of the query.
+    """
+    if 'query' in kwargs:
+        query, params = kwargs['query'], args
+    else:
+        query, params = (args[0], args[1:]) if args else (None, ())
+    extra = tuple(sorted((name, value) for name, value in kwargs.items()
+                         if name != 'query'))
+    return query, _freeze(params + extra), scope
+
+
+def connection_database(conn):
+    """
+    Database a connection is open on: the database attribute set by
+    db_connection, else the main file of a sqlite3 connection, else None.
+    """
+    database = getattr(conn, 'database', None)
+    if database is None and isinstance(conn, sqlite3.Connection):
+        database = conn.execute("PRAGMA database_list").fetchone()[2]
+    return database
+
+
+def _freeze(value):
+    """Hashable version of value: lists become tuples, dicts sorted pairs."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def cache_query(func=None, *, cache=None, ttl=None, single_flight=True):
+    """
+    Decorator that caches the result of a database query.
+
+    Results are keyed by the query string and its parameters, so the same
+    SQL with other bind values is a different entry, and by the decorated
+    function and the database of its connection, so the same SQL run by
+    another function or on another file is one too. Entries expire after
+    ttl seconds and are dropped when transactional commits a write to a
+    table they read. With single_flight, concurrent calls that miss on the
+    same key share one execution of the query (see
+    QueryCache.get_or_load). Coroutine functions are cached the same way,
+    waiting without blocking the event loop. Use it bare or as
+    @cache_query(ttl=..., ...).
+    """
+    def decorator(func):
+        name = (func.__module__, func.__qualname__)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(conn, *args, **kwargs):
+                store = default_cache if cache is None else cache
+                key = cache_key(args, kwargs,
+                                (*name, connection_database(conn)))
+                if single_flight:
+                    result, outcome = await store.get_or_load_async(
+                        key, lambda: _execute(func, conn, args, kwargs),
+                        ttl=ttl)
+                    if outcome == "hit":
+                        print("Using cached result for query.")
+                    elif outcome == "coalesced":
+                        print("Using result of the in-flight query.")
+                    return result
+
+                result = store.get(key, _MISSING)
+                if result is not _MISSING:
+                    print("Using cached result for query.")
+                    return result
+
+                print("Executing and caching query.")
+                since = store.generation
+                result = await func(conn, *args, **kwargs)
+                store.put(key, result, ttl=ttl, since=since)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            store = default_cache if cache is None else cache
+            key = cache_key(args, kwargs, (*name, connection_database(conn)))
+            if single_flight:
+                result, outcome = store.get_or_load(
+                    key, lambda: _execute(func, conn, args, kwargs), ttl=ttl)
+                if outcome == "hit":
+                    print("Using cached result for query.")
+                elif outcome == "coalesced":
+                    print("Using result of the in-flight query.")
+                return result
+
+            result = store.get(key, _MISSING)
+            if result is not _MISSING:
+                print("Using cached result for query.")
+                return result
+
+            print("Executing and caching query.")
+            since = store.generation
+            result = func(conn, *args, **kwargs)
+            store.put(key, result, ttl=ttl, since=since)
+            return result
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+def _execute(func, conn, args, kwargs):
+    """
+    Runs a query function on a cache miss; for a coroutine function the
+    returned awaitable is run by the caller.
+    """
+    print("Executing and caching query.")
+    return func(conn, *args, **kwargs)
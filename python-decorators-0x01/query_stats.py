@@ -0,0 +1,308 @@
+"""Per-fingerprint query statistics, to find the query shapes costing most"""
+import os
+import re
+import sys
+import json
+import time
+import inspect
+import sqlite3
+import functools
+import threading
+from array import array
+
+import db_connection
+from query_trace import fingerprint, query_argument, query_parameters
+
+# Histogram buckets: 8 linear sub-buckets per power of two microseconds,
+# so a reported percentile is within 12.5% of the true latency
+SUB_BUCKETS = 8
+BUCKETS = SUB_BUCKETS * 40
+
+# Placeholders of a parameterised query, outside its string literals
+_PLACEHOLDER = re.compile(r"'(?:[^']|'')*'|(\?|[:@$]\w)")
+
+# Fingerprints tracked individually; the rest are counted under OTHER
+MAX_SHAPES = 1000
+OTHER = "<other>"
+
+# Plan of a parameterised query run without its parameters
+SKIPPED = "EXPLAIN skipped: parameters unknown"
+
+
+def _bucket(us):
+    """Histogram bucket of a latency in microseconds."""
+    if us < SUB_BUCKETS:
+        return us
+    shift = us.bit_length() - 4
+    return min((shift + 1) * SUB_BUCKETS + (us >> shift) - SUB_BUCKETS,
+               BUCKETS - 1)
+
+
+def _bucket_value(index):
+    """Midpoint of a histogram bucket, in microseconds."""
+    if index < SUB_BUCKETS:
+        return float(index)
+    shift = index // SUB_BUCKETS - 1
+    low = (SUB_BUCKETS + index % SUB_BUCKETS) << shift
+    return low + ((1 << shift) - 1) / 2
+
+
+class QueryShape:
+    """
+    Statistics of every query sharing one fingerprint.
+
+    Latencies go into a fixed-size log-linear histogram, so memory does
+    not grow with the number of calls.
+    """
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+        self.histogram = array('L', [0]) * BUCKETS
+        self.plan = None
+
+    def add(self, us):
+        """Record one execution that took us microseconds."""
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+        self.histogram[_bucket(us)] += 1
+
+    def percentile(self, p):
+        """Approximate p percentile latency in microseconds (p in 0..1)."""
+        if not self.count:
+            return None
+        rank = max(1, round(p * self.count))
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return min(_bucket_value(index), float(self.max_us))
+        return float(self.max_us)
+
+    def to_dict(self):
+        """Return the statistics as a JSON serialisable dict."""
+        stats = {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "total_ms": self.total_us / 1000,
+            "avg_ms": self.total_us / self.count / 1000 if self.count else 0,
+            "max_ms": self.max_us / 1000,
+            "p50_ms": self.percentile(0.50) / 1000,
+            "p95_ms": self.percentile(0.95) / 1000,
+            "p99_ms": self.percentile(0.99) / 1000,
+        }
+        if self.plan is not None:
+            stats["plan"] = self.plan
+        return stats
+
+
+class QueryStats:
+    """
+    Aggregates query executions by fingerprint.
+
+    Optionally, the first execution of a fingerprint slower than
+    explain_threshold_ms has its EXPLAIN QUERY PLAN captured, on the
+    caller's connection if it has one.
+    """
+
+    def __init__(self, explain_threshold_ms=None, max_shapes=MAX_SHAPES):
+        """
+        Args:
+            explain_threshold_ms (float): Capture the plan of queries slower
+                than this, or None to never run EXPLAIN.
+            max_shapes (int): Fingerprints tracked before new ones are
+                lumped under OTHER.
+        """
+        self.explain_threshold_ms = explain_threshold_ms
+        self.max_shapes = max_shapes
+        self._shapes = {}
+        self._lock = threading.Lock()
+
+    def record(self, query, duration_us, conn=None, params=()):
+        """
+        Record one execution of query.
+
+        Args:
+            query (str): SQL that was run.
+            duration_us (int): Its duration in microseconds.
+            conn (sqlite3.Connection): Connection it ran on, used for
+                EXPLAIN QUERY PLAN.
+            params (tuple): Its parameters, also for EXPLAIN.
+        """
+        shape = self._add(query, duration_us)
+        if shape is not None:
+            shape.plan = explain_query(query, params, conn)
+
+    async def record_async(self, query, duration_us, conn=None, params=()):
+        """
+        Coroutine version of record: conn is an aiosqlite connection, and
+        EXPLAIN QUERY PLAN is awaited instead of blocking the event loop.
+        """
+        shape = self._add(query, duration_us)
+        if shape is not None:
+            shape.plan = await explain_query_async(query, params, conn)
+
+    def _add(self, query, duration_us):
+        """
+        Count one execution; return its shape if its plan should be
+        captured by the caller, else None.
+        """
+        key = fingerprint(query)
+        with self._lock:
+            shape = self._shapes.get(key)
+            if shape is None:
+                if len(self._shapes) >= self.max_shapes:
+                    key = OTHER
+                shape = self._shapes.setdefault(key, QueryShape(key))
+            shape.add(duration_us)
+            explain = (self.explain_threshold_ms is not None
+                       and key != OTHER and shape.plan is None
+                       and duration_us > self.explain_threshold_ms * 1000)
+            if explain:
+                shape.plan = []  # claimed: only one caller runs EXPLAIN
+        return shape if explain else None
+
+    def top(self, n=10, by="total_ms"):
+        """
+        Return the n worst query shapes.
+
+        Args:
+            n (int): Number of shapes.
+            by (str): Statistic to rank by: total_ms, count, avg_ms,
+                max_ms, p50_ms, p95_ms or p99_ms.
+        """
+        with self._lock:
+            shapes = [shape.to_dict() for shape in self._shapes.values()]
+        return sorted(shapes, key=lambda shape: shape[by], reverse=True)[:n]
+
+    def dump(self, n=10, by="total_ms", stream=None):
+        """Write the n worst query shapes as JSON lines (default stderr)."""
+        stream = stream or sys.stderr
+        for shape in self.top(n, by):
+            stream.write(json.dumps(shape) + "\n")
+        stream.flush()
+
+    def reset(self):
+        """Forget every recorded execution."""
+        with self._lock:
+            self._shapes.clear()
+
+
+def explain_query(query, params=(), conn=None):
+    """
+    Return the EXPLAIN QUERY PLAN of query as a list of detail strings.
+
+    Without a connection one is borrowed from the shared pool. Errors are
+    returned as the plan rather than raised, so capturing a plan never
+    fails the query it describes; a parameterised query given no params
+    is not explained at all.
+    """
+    if not params and _parameterised(query):
+        return [SKIPPED]
+
+    def explain(conn):
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        return [row[-1] for row in rows]
+
+    try:
+        if conn is not None:
+            return explain(conn)
+        return db_connection.with_db_connection(explain)()
+    except sqlite3.Error as e:
+        return [f"EXPLAIN failed: {e}"]
+
+
+async def explain_query_async(query, params=(), conn=None):
+    """
+    Coroutine version of explain_query; without an aiosqlite connection
+    one is borrowed from the shared async pool.
+    """
+    if not params and _parameterised(query):
+        return [SKIPPED]
+
+    async def explain(conn):
+        async with conn.execute(f"EXPLAIN QUERY PLAN {query}",
+                                params) as cursor:
+            return [row[-1] for row in await cursor.fetchall()]
+
+    try:
+        if conn is not None:
+            return await explain(conn)
+        return await db_connection.with_db_connection(explain)()
+    except sqlite3.Error as e:
+        return [f"EXPLAIN failed: {e}"]
+
+
+def _parameterised(query):
+    """Whether query has bind placeholders outside its string literals."""
+    return any(match.group(1) for match in _PLACEHOLDER.finditer(query))
+
+
+def _async_connection(args):
+    """The aiosqlite connection passed as first argument, if any."""
+    # aiosqlite is optional; if it was never imported, no argument is one
+    aiosqlite = sys.modules.get('aiosqlite')
+    if aiosqlite is not None and args and \
+            isinstance(args[0], aiosqlite.Connection):
+        return args[0]
+    return None
+
+
+# Statistics fed by collect_stats unless others are given; plans are
+# captured above QUERY_EXPLAIN_MS milliseconds when it is set
+default_stats = QueryStats(
+    explain_threshold_ms=float(os.environ['QUERY_EXPLAIN_MS'])
+    if os.getenv('QUERY_EXPLAIN_MS') else None)
+
+
+def collect_stats(func=None, *, stats=None):
+    """
+    Decorator that records the duration of every query the decorated
+    function runs, by fingerprint (see QueryStats).
+
+    The query is the 'query' argument or the first string argument, and
+    its parameters the 'params' argument or the arguments after it (see
+    query_trace.query_parameters); a sqlite3.Connection first argument is
+    used for EXPLAIN QUERY PLAN.
+    Place it below cache_query so that only real executions are counted.
+    Coroutine functions are timed until they complete, and their plans are
+    awaited on their aiosqlite connection, or one of the shared async pool.
+    """
+    def decorator(func):
+        clock = time.perf_counter_ns
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = clock()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    store = default_stats if stats is None else stats
+                    await store.record_async(query_argument(args, kwargs),
+                                             (clock() - started) // 1000,
+                                             _async_connection(args),
+                                             query_parameters(args, kwargs))
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                store = default_stats if stats is None else stats
+                conn = args[0] if args and \
+                    isinstance(args[0], sqlite3.Connection) else None
+                store.record(query_argument(args, kwargs),
+                             (clock() - started) // 1000, conn,
+                             query_parameters(args, kwargs))
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
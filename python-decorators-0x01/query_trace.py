@@ -0,0 +1,213 @@
+"""Low-overhead structured tracing of the queries run by decorated functions"""
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import inspect
+import random
+import functools
+import threading
+from collections import deque
+
+# Literals and lists replaced by ? in query fingerprints
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(query):
+    """
+    Normalised shape of a query: literals become ?, IN lists collapse to
+    (?+), whitespace and case are folded. Queries that differ only in
+    their values share a fingerprint.
+    """
+    shape = _NUMBER.sub("?", _STRING.sub("?", query))
+    shape = _LIST.sub("(?+)", shape)
+    return _SPACE.sub(" ", shape).strip().lower()
+
+
+def query_argument(args, kwargs):
+    """The query of a call: the 'query' keyword or the first str argument."""
+    query = kwargs.get('query')
+    if query is None:
+        query = next((arg for arg in args if isinstance(arg, str)), '')
+    return query
+
+
+def query_parameters(args, kwargs):
+    """
+    The bind parameters of a call: the 'params' keyword, or the arguments
+    after a positional query; a single list, tuple or dict among them is
+    used as is.
+    """
+    if 'params' in kwargs:
+        return kwargs['params']
+    if 'query' in kwargs:
+        return ()
+    index = next((i for i, arg in enumerate(args) if isinstance(arg, str)),
+                 len(args))
+    rest = args[index + 1:]
+    if len(rest) == 1 and isinstance(rest[0], (list, tuple, dict)):
+        return rest[0]
+    return rest
+
+
+class Tracer:
+    """
+    Collects one record per traced call and writes them as JSON lines.
+
+    The calling thread only builds a tuple and appends it to a bounded
+    deque, whose append and popleft are atomic, so no lock is taken on
+    the hot path; when the ring is full the oldest records are dropped.
+    A daemon thread drains the ring every interval seconds and formats
+    the records.
+    """
+
+    def __init__(self, path=None, sample_rate=1.0, capacity=65536,
+                 interval=1.0):
+        """
+        Args:
+            path (str): File the records are appended to, or "-" for
+                stderr; defaults to QUERY_TRACE or "-".
+            sample_rate (float): Fraction of calls traced, 0 to 1.
+            capacity (int): Records held before the oldest are dropped.
+            interval (float): Seconds between two flushes.
+        """
+        self.path = path or os.getenv('QUERY_TRACE', '-')
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.dropped = 0  # approximate: updated without a lock
+        self._ring = deque(maxlen=capacity)
+        # Converts perf_counter_ns readings to Unix time
+        self._epoch_offset = time.time_ns() - time.perf_counter_ns()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, name, query, started, ended, rows, error=None):
+        """Queue the record of one call; timestamps are perf_counter_ns."""
+        ring = self._ring
+        if len(ring) == ring.maxlen:
+            self.dropped += 1
+        ring.append((name, query, started, ended, rows, error))
+
+    def sampled(self):
+        """Whether the next call should be traced."""
+        rate = self.sample_rate
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+    def start(self):
+        """Start the background flusher, once."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                             name="query-trace-flusher")
+            self._thread.start()
+            atexit.register(self.close)
+
+    def flush(self):
+        """Write every queued record now."""
+        pop = self._ring.popleft
+        lines = []
+        while True:
+            try:
+                name, query, started, ended, rows, error = pop()
+            except IndexError:
+                break
+            record = {
+                "function": name,
+                "fingerprint": fingerprint(query),
+                "start_ns": started + self._epoch_offset,
+                "end_ns": ended + self._epoch_offset,
+                "duration_us": (ended - started) / 1000,
+                "rows": rows,
+            }
+            if error is not None:
+                record["error"] = error
+            lines.append(json.dumps(record) + "\n")
+        if lines:
+            self._write(lines)
+
+    def close(self):
+        """Stop the flusher and write what is left."""
+        self._stop.set()
+        if self._thread is not None and \
+                self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def _write(self, lines):
+        with self._write_lock:
+            if self.path == "-":
+                sys.stderr.writelines(lines)
+                sys.stderr.flush()
+            else:
+                with open(self.path, "a", encoding="utf-8") as output:
+                    output.writelines(lines)
+
+
+# Tracer used by log_queries unless another one is given
+default_tracer = Tracer(sample_rate=float(os.getenv('QUERY_TRACE_SAMPLE', '1')))
+
+
+def log_queries(func=None, *, tracer=None):
+    """
+    Decorator that traces the SQL queries run by the decorated function.
+
+    For each sampled call it records the function, the query fingerprint,
+    start and end times from a monotonic clock, the duration, the number of
+    rows returned and any error, and hands the record to a background
+    writer (see Tracer). The query is the 'query' argument or the first
+    string argument. Coroutine functions are timed until they complete.
+    """
+    def decorator(func):
+        trace = default_tracer if tracer is None else tracer
+        trace.start()
+        name = func.__qualname__
+        clock = time.perf_counter_ns
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not trace.sampled():
+                    return await func(*args, **kwargs)
+                started = clock()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    trace.record(name, query_argument(args, kwargs), started,
+                                 clock(), None, type(e).__name__)
+                    raise
+                trace.record(name, query_argument(args, kwargs), started,
+                             clock(),
+                             len(result) if isinstance(result, list) else None)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not trace.sampled():
+                return func(*args, **kwargs)
+            started = clock()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                trace.record(name, query_argument(args, kwargs), started,
+                             clock(), None, type(e).__name__)
+                raise
+            trace.record(name, query_argument(args, kwargs), started,
+                         clock(),
+                         len(result) if isinstance(result, list) else None)
+            return result
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
@@ -0,0 +1,168 @@
+"""Retry policy: error classification, jittered backoff and a retry budget"""
+import time
+import asyncio
+import inspect
+import random
+import sqlite3
+import functools
+import threading
+
+# OperationalError messages of transient conditions worth retrying
+TRANSIENT_MESSAGES = (
+    "database is locked",
+    "database table is locked",
+    "database schema has changed",
+    "disk i/o error",
+    "unable to open database file",
+    "no connection",  # db_connection.PoolTimeout
+)
+
+# Further DatabaseError messages meaning the database is not usable:
+# not worth retrying, but counted by circuit breakers
+UNAVAILABLE_MESSAGES = TRANSIENT_MESSAGES + (
+    "no such table",  # empty or wrong database file
+    "file is not a database",
+)
+
+
+def is_retryable(error):
+    """
+    Whether error is transient, so the same call may succeed later.
+
+    Lock contention, I/O hiccups and connection timeouts are retryable;
+    programming errors such as syntax errors, missing tables or constraint
+    violations are fatal and would fail again.
+    """
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return any(text in message for text in TRANSIENT_MESSAGES)
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def is_unavailable(error):
+    """
+    Whether error means the database cannot serve queries at the moment.
+
+    Every retryable error does, and so does a database file without the
+    expected schema or one that is not a database at all: retrying the
+    call would not help, but every other call fails the same way until
+    the database is provisioned again.
+    """
+    if isinstance(error, sqlite3.DatabaseError):
+        message = str(error).lower()
+        return any(text in message for text in UNAVAILABLE_MESSAGES)
+    return is_retryable(error)
+
+
+class RetryBudget:
+    """
+    Token bucket capping how many retries the process makes.
+
+    Each retry takes a token; tokens refill at rate per second up to
+    capacity. When the database is down and every call fails, retries stop
+    once the bucket is empty instead of multiplying the load it sees.
+    """
+
+    def __init__(self, rate=10.0, capacity=20.0):
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): Maximum tokens, i.e. the largest burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.granted = 0
+        self.denied = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token for one retry; False if the budget is spent."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.granted += 1
+                return True
+            self.denied += 1
+            return False
+
+
+# Budget shared by every retry_on_failure unless another is given
+default_budget = RetryBudget()
+
+
+def backoff_delay(attempt, delay, max_delay):
+    """
+    Full-jitter exponential backoff: a uniform random wait between 0 and
+    delay * 2**(attempt - 1), capped at max_delay, so clients that failed
+    together do not retry together.
+    """
+    return random.uniform(0, min(max_delay, delay * 2 ** (attempt - 1)))
+
+
+def retry_on_failure(retries=3, delay=2, max_delay=30, retryable=None,
+                     budget=None):
+    """
+    Decorator that retries a function if it raises a transient exception.
+
+    Parameters:
+    - retries: number of attempts, the first call included
+    - delay: base delay in seconds, doubled at each attempt and jittered
+    - max_delay: cap on a single wait in seconds
+    - retryable: predicate classifying exceptions, default is_retryable;
+      other exceptions are raised at once
+    - budget: RetryBudget limiting retries, default the process-wide one
+
+    Coroutine functions are retried with asyncio.sleep, so the event loop
+    keeps running while a call waits for its next attempt.
+    """
+    classify = retryable or is_retryable
+
+    def should_retry(e, attempt):
+        """Print the failure and decide whether to try again."""
+        print(f"Attempt {attempt} failed: {e}")
+        if not classify(e):
+            print("Error is not retryable.")
+            return False
+        if attempt >= retries:
+            print("Max retry attempts reached.")
+            return False
+        if not (budget or default_budget).try_acquire():
+            print("Retry budget exhausted.")
+            return False
+        return True
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                attempt = 0
+                while True:
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        attempt += 1
+                        if not should_retry(e, attempt):
+                            raise
+                        await asyncio.sleep(
+                            backoff_delay(attempt, delay, max_delay))
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            attempt = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    attempt += 1
+                    if not should_retry(e, attempt):
+                        raise
+                    time.sleep(backoff_delay(attempt, delay, max_delay))
+        return wrapper
+    return decorator
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Tests the `circuit_breaker` module.
+"""
+import os
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+
+from circuit_breaker import (CircuitBreaker, CircuitOpenError, CLOSED,
+                             HALF_OPEN, OPEN, circuit_breaker)
+from db_connection import with_db_connection
+
+
+def fail():
+    raise sqlite3.OperationalError("database is locked")
+
+
+def interrupt():
+    raise KeyboardInterrupt
+
+
+class TestTrialSlots(unittest.TestCase):
+    """Tests that half-open trial slots are always given back."""
+
+    def setUp(self) -> None:
+        """Opens a breaker that half-opens at once with one trial slot."""
+        self.breaker = CircuitBreaker("test", min_calls=1, reset_timeout=0,
+                                      trial_calls=1)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.breaker.call(fail)
+
+    def test_interrupted_trial(self) -> None:
+        """Tests that a KeyboardInterrupt does not keep the slot."""
+        with self.assertRaises(KeyboardInterrupt):
+            self.breaker.call(interrupt)
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertEqual(self.breaker.call(lambda: 1), 1)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_cancelled_trial(self) -> None:
+        """Tests that a cancelled async trial does not keep the slot."""
+        async def hang():
+            await asyncio.sleep(60)
+
+        async def ok():
+            return 1
+
+        async def main():
+            task = asyncio.ensure_future(self.breaker.call_async(hang))
+            await asyncio.sleep(0)
+            with self.assertRaises(CircuitOpenError):
+                await self.breaker.call_async(ok)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return await self.breaker.call_async(ok)
+
+        self.assertEqual(asyncio.run(main()), 1)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+
+class TestUnavailableDatabase(unittest.TestCase):
+    """Tests the breaker in front of a database that cannot be used."""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "users.db")
+        self.breaker = CircuitBreaker("test", min_calls=4)
+
+        @circuit_breaker(self.breaker)
+        @with_db_connection(path=self.path)
+        def fetch(conn):
+            return conn.execute("SELECT * FROM users").fetchall()
+        self.fetch = fetch
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def assertOpensAfter(self, calls) -> None:
+        """Asserts that calls failures open the breaker."""
+        for _ in range(calls):
+            self.assertEqual(self.breaker.state, CLOSED)
+            with self.assertRaises(sqlite3.DatabaseError):
+                self.fetch()
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.fetch()
+
+    def test_missing_file(self) -> None:
+        """Tests that a missing database file opens the breaker."""
+        self.assertOpensAfter(4)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_missing_table(self) -> None:
+        """Tests that a database without the users table opens it."""
+        sqlite3.connect(self.path).close()
+        self.assertOpensAfter(4)
+
+
+if __name__ == "__main__":
+    unittest.main()
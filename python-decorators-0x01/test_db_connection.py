@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Tests the connection pools of the `db_connection` module.
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+import threading
+import subprocess
+
+from db_connection import ConnectionPool
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Uses an async pooled connection, then lets asyncio.run() shut down
+ASYNC_SCRIPT = """
+import asyncio
+from db_connection import with_db_connection
+
+@with_db_connection
+async def count(conn):
+    async with conn.execute("SELECT COUNT(*) FROM users") as cursor:
+        return await cursor.fetchone()
+
+print(asyncio.run(count()))
+"""
+
+
+class TestAsyncPool(unittest.TestCase):
+    """Tests the aiosqlite pool used by async `with_db_connection`."""
+
+    def setUp(self) -> None:
+        """Creates a users table with a few rows in a scratch database."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "users.db")
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+        conn.executemany("INSERT INTO users DEFAULT VALUES", [()] * 3)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_asyncio_run_exits(self) -> None:
+        """Tests that idle pooled connections do not keep the process up."""
+        env = dict(os.environ, USERS_DB_PATH=self.path,
+                   PYTHONPATH=HERE)
+        result = subprocess.run(
+            [sys.executable, "-c", ASYNC_SCRIPT], env=env, cwd=HERE,
+            capture_output=True, text=True, timeout=20)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "(3,)")
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Tests the sqlite3 pool used by `with_db_connection`."""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "users.db")
+        sqlite3.connect(self.path).close()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_drop_wakes_waiter(self) -> None:
+        """Tests that dropping a broken connection wakes a waiter."""
+        pool = ConnectionPool(self.path, size=1, timeout=5)
+        conn = pool.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(
+            pool.acquire()))
+        waiter.start()
+        conn.close()  # broken: release() cannot roll it back
+        pool.release(conn)
+        waiter.join(2)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(len(acquired), 1)
+        pool.release(acquired[0])
+        pool.close()
+
+    def test_missing_database(self) -> None:
+        """Tests that a missing database file is not created empty."""
+        os.remove(self.path)
+        pool = ConnectionPool(self.path, size=1)
+        with self.assertRaisesRegex(sqlite3.OperationalError,
+                                    "unable to open database file"):
+            pool.acquire()
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
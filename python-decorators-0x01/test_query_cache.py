@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Tests the `query_cache` module.
+"""
+import os
+import time
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+import threading
+
+from db_connection import transactional, with_db_connection
+from query_cache import ANY_TABLE, QueryCache, cache_query, table_written
+
+KEY = ("SELECT * FROM users", ())
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Tests the coalescing of concurrent misses from many threads."""
+
+    THREADS = 32
+
+    def run_threads(self, cache, load):
+        """Calls get_or_load from every thread at once; returns outcomes."""
+        barrier = threading.Barrier(self.THREADS)
+        results = [None] * self.THREADS
+
+        def call(index):
+            barrier.wait()
+            try:
+                results[index] = cache.get_or_load(KEY, load)
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=call, args=(index,))
+                   for index in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_one_execution(self) -> None:
+        """Tests that concurrent misses run the query exactly once."""
+        cache = QueryCache()
+        calls = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.05)
+            return ["row"]
+
+        for _ in range(20):
+            cache.clear()
+            calls.clear()
+            results = self.run_threads(cache, load)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual({id(value) for value, _ in results},
+                             {id(results[0][0])})
+            outcomes = [outcome for _, outcome in results]
+            self.assertEqual(outcomes.count("loaded"), 1)
+            self.assertLessEqual(set(outcomes),
+                                 {"loaded", "coalesced", "hit"})
+
+    def test_shared_failure(self) -> None:
+        """Tests that a failure reaches every waiter and is not cached."""
+        cache = QueryCache()
+        calls = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.05)
+            raise RuntimeError("query failed")
+
+        results = self.run_threads(cache, load)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, RuntimeError)
+                            for result in results))
+        self.assertEqual(len({id(result) for result in results}), 1)
+        self.assertNotIn(KEY, cache)
+        self.assertEqual(cache.get_or_load(KEY, lambda: ["row"]),
+                         (["row"], "loaded"))
+
+
+class TestAsyncSingleFlight(unittest.TestCase):
+    """Tests the coalescing of concurrent async misses."""
+
+    def test_cancelled_leader(self) -> None:
+        """Tests that a waiter takes the load over from a cancelled leader."""
+        cache = QueryCache()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.05 if len(calls) == 1 else 0)
+            return len(calls)
+
+        async def main():
+            leader = asyncio.ensure_future(cache.get_or_load_async(KEY, load))
+            await asyncio.sleep(0)
+            waiters = [asyncio.ensure_future(cache.get_or_load_async(KEY, load))
+                       for _ in range(5)]
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await asyncio.gather(*waiters)
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(sorted(outcome for _, outcome in results),
+                         ["coalesced"] * 4 + ["loaded"])
+        self.assertEqual({value for value, _ in results}, {2})
+        self.assertEqual(cache.get(KEY), 2)
+
+
+class TestCacheKey(unittest.TestCase):
+    """Tests which calls of `cache_query` functions share an entry."""
+
+    def setUp(self) -> None:
+        """Creates users.db with one user and other.db with none."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = {}
+        for name, rows in (("users", 1), ("other", 0)):
+            path = self.paths[name] = os.path.join(self.directory.name,
+                                                   f"{name}.db")
+            conn = sqlite3.connect(path)
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+            conn.executemany("INSERT INTO users DEFAULT VALUES", [()] * rows)
+            conn.commit()
+            conn.close()
+        self.cache = QueryCache()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def fetcher(self, name):
+        """A cached function reading the users of database name."""
+        @with_db_connection(path=self.paths[name])
+        @cache_query(cache=self.cache)
+        def fetch(conn, query):
+            return conn.execute(query).fetchall()
+        return fetch
+
+    def test_other_database(self) -> None:
+        """Tests that the same SQL on another database is not shared."""
+        self.assertEqual(self.fetcher("users")(query="SELECT * FROM users"),
+                         [(1,)])
+        self.assertEqual(self.fetcher("other")(query="SELECT * FROM users"),
+                         [])
+
+    def test_other_function(self) -> None:
+        """Tests that the same SQL in another function is not shared."""
+        @with_db_connection(path=self.paths["users"])
+        @cache_query(cache=self.cache)
+        def count(conn, query):
+            return len(conn.execute(query).fetchall())
+
+        self.fetcher("users")("SELECT * FROM users")
+        self.assertEqual(count("SELECT * FROM users"), 1)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_async_other_database(self) -> None:
+        """Tests that async entries are also kept apart by database."""
+        def fetcher(name):
+            @with_db_connection(path=self.paths[name])
+            @cache_query(cache=self.cache)
+            async def fetch(conn, query):
+                async with conn.execute(query) as cursor:
+                    return await cursor.fetchall()
+            return fetch
+
+        async def main():
+            return (await fetcher("users")("SELECT * FROM users"),
+                    await fetcher("other")("SELECT * FROM users"))
+
+        self.assertEqual(asyncio.run(main()), ([(1,)], []))
+
+
+class TestTableWritten(unittest.TestCase):
+    """Tests the classification of the statements a transaction runs."""
+
+    def test_with_clause(self) -> None:
+        """Tests that the statement after a WITH clause is classified."""
+        self.assertEqual(table_written(
+            "WITH old AS (SELECT id FROM users WHERE age > 99) "
+            "UPDATE users SET age = 99 WHERE id IN (SELECT id FROM old)"),
+            "users")
+        self.assertIsNone(table_written(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL "
+            "SELECT i + 1 FROM n WHERE i < 3) SELECT * FROM n"))
+
+    def test_unknown_statement(self) -> None:
+        """Tests that statements not known to be reads write anything."""
+        self.assertEqual(table_written("VACUUM"), ANY_TABLE)
+        self.assertIsNone(table_written("  -- note\nSELECT * FROM users"))
+
+    def test_cte_update_invalidates(self) -> None:
+        """Tests that a committed CTE update drops the cached users."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "users.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, age INT)")
+        conn.execute("INSERT INTO users VALUES (1, 20)")
+        conn.commit()
+        conn.close()
+        cache = QueryCache()
+
+        @with_db_connection(path=path)
+        @cache_query(cache=cache)
+        def fetch(conn, query):
+            return conn.execute(query).fetchall()
+
+        @with_db_connection(path=path)
+        @transactional(cache=cache)
+        def age_everyone(conn):
+            conn.execute("WITH young AS (SELECT id FROM users) "
+                         "UPDATE users SET age = 30 "
+                         "WHERE id IN (SELECT id FROM young)")
+
+        self.assertEqual(fetch("SELECT * FROM users"), [(1, 20)])
+        age_everyone()
+        self.assertEqual(fetch("SELECT * FROM users"), [(1, 30)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Tests the `query_stats` module.
+"""
+import os
+import sqlite3
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import db_connection
+from db_connection import with_db_connection
+from query_stats import SKIPPED, QueryStats, collect_stats
+
+
+class TestExplain(unittest.TestCase):
+    """Tests the capture of query plans by `collect_stats`."""
+
+    def setUp(self) -> None:
+        """Creates a users table in a scratch database."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "users.db")
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, age INT)")
+        conn.commit()
+        conn.close()
+        self.stats = QueryStats(explain_threshold_ms=0)
+        env = patch.dict(os.environ, USERS_DB_PATH=self.path)
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_async_plan_on_own_connection(self) -> None:
+        """Tests that async plans are awaited on the caller's connection."""
+        @with_db_connection
+        @collect_stats(stats=self.stats)
+        async def fetch(conn, query):
+            async with conn.execute(query) as cursor:
+                return await cursor.fetchall()
+
+        with patch.object(db_connection, "get_pool") as get_pool:
+            asyncio.run(fetch("SELECT * FROM users WHERE age > 25"))
+        get_pool.assert_not_called()
+        plan, = [shape["plan"] for shape in self.stats.top()]
+        self.assertTrue(plan)
+        self.assertFalse(plan[0].startswith("EXPLAIN failed"), plan)
+
+    def test_plan_of_parameterised_query(self) -> None:
+        """Tests that EXPLAIN is given the parameters of the query."""
+        @with_db_connection
+        @collect_stats(stats=self.stats)
+        def fetch(conn, query, age):
+            return conn.execute(query, (age,)).fetchall()
+
+        fetch("SELECT * FROM users WHERE age > ?", 25)
+        plan, = [shape["plan"] for shape in self.stats.top()]
+        self.assertTrue(plan)
+        self.assertFalse(plan[0].startswith("EXPLAIN failed"), plan)
+
+    def test_parameters_unknown(self) -> None:
+        """Tests that a query run without visible parameters is skipped."""
+        @with_db_connection
+        @collect_stats(stats=self.stats)
+        def fetch(conn, query):
+            return conn.execute(query, (25,)).fetchall()
+
+        fetch("SELECT * FROM users WHERE age > ?")
+        plan, = [shape["plan"] for shape in self.stats.top()]
+        self.assertEqual(plan, [SKIPPED])
+
+
+if __name__ == "__main__":
+    unittest.main()
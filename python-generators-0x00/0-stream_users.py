@@ -1,38 +1,42 @@
 #!/usr/bin/python3
 """Generator function to stream rows from the user_data table one by one."""
-import os
-import pymysql
-from dotenv import load_dotenv
+backends = __import__('backends')
+seed = __import__('seed')
 
-# Load environment variables from .env file
-load_dotenv()
 
-
-def stream_users():
+def stream_users(columns=None, unbuffered=False, chunk_size=1000):
     """
     Generator function that fetches rows one by one from the user_data table.
     Uses the yield keyword to return each row individually.
     Contains no more than 1 loop.
+
+    Args:
+        columns (iterable): Columns to select, or None for all of them.
+        unbuffered (bool): Stream from a server-side cursor instead of
+            loading the whole result set into client memory first.
+        chunk_size (int): Rows fetched per round trip in unbuffered mode.
     """
+    query = f"SELECT {seed.select_columns(columns)} FROM user_data"
+    backend = backends.get_backend()
+
     try:
-        # Connect to the database
-        connection = pymysql.connect(
-            host=os.getenv("MYSQL_HOST"),
-            port=int(os.getenv("MYSQL_PORT")),
-            user=os.getenv("MYSQL_USER"),
-            password=os.getenv("MYSQL_PASSWORD"),
-            database=os.getenv("MYSQL_DB"),
-            cursorclass=pymysql.cursors.DictCursor  # Return results as dictionaries
-        )
+        # Check a connection out of the configured backend
+        connection = backend.connect()
 
-        with connection:
-            # Create a cursor and execute query
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT * FROM user_data")
-    
-                # Use a single loop to yield rows one by one
-                for row in cursor:
-                    yield row
+        rows = backend.stream(connection, query, chunk_size=chunk_size,
+                              buffered=not unbuffered, discard_early=True)
+        try:
+            # Use a single loop to yield rows one by one
+            for row in rows:
+                yield row
+        finally:
+            # Finish the cursor before the connection goes back to the pool;
+            # an unbuffered scan stopped early discards the connection
+            # instead of draining the rest of the table
+            rows.close()
+            connection.close()
 
     except Exception as e:
-        print(f"Error connecting to MySQL: {e}")
+        print(f"Error connecting to the database: {e}")
+        # Re-raise so a failed scan is not mistaken for the end of the table
+        raise
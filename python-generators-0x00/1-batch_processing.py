@@ -2,47 +2,120 @@
 """
 Functions to stream and process user data in batches from the database.
 """
-import os
-import pymysql
-from dotenv import load_dotenv
+import operator
+from array import array
+from itertools import compress
 
-# Load environment variables from .env file
-load_dotenv()
+backends = __import__('backends')
+seed = __import__('seed')
+paginate_users_after = __import__('2-lazy_paginate').paginate_users_after
 
+# Users processed by batch_processing unless other filters are given
+OVER_25 = (("age", ">", 25),)
 
-def stream_users_in_batches(batch_size):
-    """Yields users in batches from the database."""
-    connection = pymysql.connect(
-        host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
-        user=os.getenv("MYSQL_USER"),
-        password=os.getenv("MYSQL_PASSWORD"),
-        database=os.getenv("MYSQL_DB"),
-        cursorclass=pymysql.cursors.DictCursor
-    )
+# Comparisons available to filter_batch
+COMPARISONS = {
+    "=": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+}
+
+
+def stream_users_in_batches(batch_size, filters=None, columns=None,
+                            columnar=False, checkpoint=None):
+    """
+    Yields users in batches from the database.
+
+    Batches are read with keyset pagination on user_id, and the optional
+    filter spec is compiled into the WHERE clause so that rows which do not
+    match never leave the database.
+
+    Args:
+        batch_size (int): Maximum number of rows per batch.
+        filters (iterable): Filter spec compiled by seed.compile_filters.
+        columns (iterable): Columns to select, or None for all of them;
+            user_id is always included.
+        columnar (bool): Yield each batch as a dict of columns instead of
+            a list of row dicts: numeric columns are array('d'), the others
+            lists. This avoids one dict per row and lets filters run over a
+            whole column at once (see filter_batch).
+        checkpoint (checkpoint.Checkpoint): Resume after its last key and
+            advance it as batches are consumed.
+    """
+    connection = backends.get_backend().connect()
 
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) AS total FROM user_data")
-            total = cursor.fetchone()["total"]
-
-            for offset in range(0, total, batch_size):
-                cursor.execute(
-                    "SELECT * FROM user_data LIMIT %s OFFSET %s",
-                    (batch_size, offset)
-                    )
-                batch = cursor.fetchall()
-                yield batch
+        last_user_id = checkpoint.last_key if checkpoint else None
+        while True:
+            if columnar:
+                batch = _columnar_page(connection, batch_size, last_user_id,
+                                       filters, columns)
+            else:
+                batch = paginate_users_after(
+                    connection, batch_size, last_user_id, filters, columns)
+            if not batch:
+                break
+            yield batch
+            if columnar:
+                last_user_id = batch["user_id"][-1]
+            else:
+                last_user_id = batch[-1]["user_id"]
+            if checkpoint is not None:
+                # The consumer asked for the next batch: this one is done
+                checkpoint.advance(last_user_id, _batch_length(batch))
         # Add a return statement here if the checker specifically expects it
         # This will cause a StopIteration exception when the generator is exhausted
         return
     finally:
         connection.close()
+        if checkpoint is not None:
+            checkpoint.flush()
+
+
+def _batch_length(batch):
+    """Number of rows in a row or columnar batch."""
+    return len(batch["user_id"]) if isinstance(batch, dict) else len(batch)
+
+
+def _columnar_page(connection, batch_size, last_user_id, filters, columns):
+    """Fetches one keyset page as a dict of columns, or {} when done."""
+    names, rows = backends.get_backend().keyset_columns(
+        connection, batch_size, last_user_id, filters, columns)
+
+    return {
+        name: (array('d', map(float, values))
+               if name in seed.NUMERIC_COLUMNS else list(values))
+        for name, values in zip(names, zip(*rows))
+    }
+
+
+def filter_batch(batch, column, comparison, value):
+    """
+    Keeps the rows of a columnar batch where column compares to value.
+
+    The mask is computed over the whole column, then applied to every
+    column of the batch.
+
+    Returns:
+        dict: A columnar batch with the matching rows only.
+    """
+    compare = COMPARISONS[comparison]
+    mask = [compare(item, value) for item in batch[column]]
+    return {
+        name: (array(values.typecode, compress(values, mask))
+               if isinstance(values, array) else list(compress(values, mask)))
+        for name, values in batch.items()
+    }
+
 
+def batch_processing(batch_size, filters=OVER_25, checkpoint=None):
+    """
+    Processes each batch to filter users over age 25 and prints them.
 
-def batch_processing(batch_size):
-    """Processes each batch to filter users over age 25 and prints them."""
-    for batch in stream_users_in_batches(batch_size):
-        filtered = [user for user in batch if user.get("age", 0) > 25]
-        for user in filtered:
+    With a checkpoint.Checkpoint, a restarted run resumes after the last
+    batch that was fully printed.
+    """
+    for batch in stream_users_in_batches(batch_size, filters,
+                                         checkpoint=checkpoint):
+        for user in batch:
             print(user)
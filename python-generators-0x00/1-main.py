@@ -10,13 +10,21 @@
 #     print(user)
 
 #!/usr/bin/python3
+import os
 from itertools import islice
 from importlib import import_module
 
 # Import the module and get the function
 module = import_module('0-stream_users')
 stream_users = module.stream_users
+instrument = import_module('instrument')
 
 # iterate over the generator function and print only the first 6 rows
-for user in islice(stream_users(), 6):
+users = instrument.instrument(stream_users(), "stream_users")
+for user in islice(users, 6):
     print(user)
+users.close()
+
+# GENERATOR_METRICS=- (stderr) or a file path dumps per-stage metrics
+if os.getenv("GENERATOR_METRICS"):
+    instrument.dump_metrics()
@@ -1,24 +1,170 @@
 #!/usr/bin/python3
+import base64
+import json
+import queue
+import threading
+
+backends = __import__('backends')
+handoff = __import__('handoff')
 seed = __import__('seed')
 
+# Kept here for callers that build keyset queries themselves
+keyset_query = backends.keyset_query
+
 
 def paginate_users(page_size, offset):
     """
     Fetches a page of user data from the database.
     """
     connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
-    rows = cursor.fetchall()
-    connection.close()
-    return rows
+    if connection is None:
+        raise ConnectionError("Could not connect to ALX_prodev")
+
+    try:
+        return backends.get_backend().fetch_all(
+            connection, "SELECT * FROM user_data LIMIT %s OFFSET %s",
+            (page_size, offset))
+    finally:
+        connection.close()
+
+
+def paginate_users_after(connection, page_size, last_user_id=None,
+                         filters=None, columns=None):
+    """
+    Fetches the page of user data that follows last_user_id.
+
+    Seeks on the user_id primary key instead of skipping rows with OFFSET,
+    so every page costs the same however deep into the table it is.
+
+    Args:
+        connection: An open database connection.
+        page_size (int): Maximum number of rows in the page.
+        last_user_id (str): user_id of the last row already seen,
+            or None to start from the beginning of the table.
+        filters (iterable): Filter spec compiled by seed.compile_filters
+            into the WHERE clause, so only matching rows are sent.
+        columns (iterable): Columns to select, or None for all of them;
+            user_id is always included.
+
+    Returns:
+        list: Rows as dictionaries, ordered by user_id.
+    """
+    return backends.get_backend().keyset_page(
+        connection, page_size, last_user_id, filters, columns)
+
 
+def encode_cursor(last_user_id):
+    """Encodes the last seen user_id as an opaque, URL-safe cursor token."""
+    payload = json.dumps({"after": last_user_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
 
-def lazy_pagination(page_size):
+
+def decode_cursor(token):
+    """
+    Decodes a cursor token produced by encode_cursor.
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))["after"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {token!r}") from e
+
+
+def page_cursor(page):
+    """
+    Returns the cursor token that resumes pagination right after page,
+    or None if the page is empty.
+    """
+    if not page:
+        return None
+    return encode_cursor(page[-1]["user_id"])
+
+
+def lazy_pagination(page_size, keyset=False, cursor=None, checkpoint=None,
+                    prefetch=0):
     """
     A generator function that lazily loads pages of user data.
     It fetches the next page only when needed, starting at an offset of 0.
+
+    With keyset=True (or when a cursor token or checkpoint is given) pages
+    are walked along the user_id primary key on a single connection, and a
+    crashed job can resume from the token returned by page_cursor for its
+    last page, or from a checkpoint.Checkpoint advanced after each page.
+
+    With prefetch=K a background thread fetches up to K pages ahead while
+    the current one is being consumed, overlapping network latency with
+    the consumer's work.
+    """
+    if keyset or cursor is not None or checkpoint is not None:
+        if cursor is not None:
+            last_user_id = decode_cursor(cursor)
+        else:
+            last_user_id = checkpoint.last_key if checkpoint else None
+        pages = _keyset_pagination(page_size, last_user_id)
+    else:
+        pages = _offset_pagination(page_size)
+    if prefetch:
+        pages = prefetch_pages(pages, prefetch)
+
+    try:
+        for rows in pages:
+            yield rows
+
+            # The consumer asked for the next page: this one is done
+            if checkpoint is not None:
+                checkpoint.advance(rows[-1]["user_id"], len(rows))
+    finally:
+        pages.close()
+        if checkpoint is not None:
+            checkpoint.flush()
+
+
+def prefetch_pages(pages, depth):
     """
+    Generator that runs pages in a background thread.
+
+    Up to depth pages are fetched ahead of the consumer. When the consumer
+    stops early (e.g. through islice), the thread stops after the page it
+    is fetching and closes pages, releasing its connection.
+
+    Args:
+        pages (generator): Pages to fetch ahead.
+        depth (int): Maximum number of pages waiting to be consumed.
+    """
+    buffer = queue.Queue(depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for page in pages:
+                if not handoff.put(buffer, page, stop):
+                    break
+        except Exception as e:
+            handoff.put(buffer, e, stop)
+        finally:
+            pages.close()
+            handoff.put(buffer, handoff.DONE, stop)
+
+    thread = threading.Thread(target=produce, name="lazy_pagination-prefetch",
+                              daemon=True)
+    thread.start()
+    try:
+        while True:
+            page = buffer.get()
+            if page is handoff.DONE:
+                break
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _offset_pagination(page_size):
+    """Yields LIMIT/OFFSET pages, one connection per page."""
     offset: int = 0
     while True:
         rows = paginate_users(page_size, offset)
@@ -26,9 +172,28 @@ def lazy_pagination(page_size):
 
         if not rows:
             break
-        
+
         # yield results
         yield rows
-        
+
         # increment offset
         offset += page_size
+
+
+def _keyset_pagination(page_size, last_user_id=None):
+    """Yields keyset pages over one long-lived connection."""
+    connection = seed.connect_to_prodev()
+    if connection is None:
+        raise ConnectionError("Could not connect to ALX_prodev")
+
+    try:
+        while True:
+            rows = paginate_users_after(connection, page_size, last_user_id)
+            if not rows:
+                break
+
+            yield rows
+
+            last_user_id = rows[-1]["user_id"]
+    finally:
+        connection.close()
@@ -1,12 +1,18 @@
 #!/usr/bin/python3
+import os
 import sys
 lazy_paginator = __import__('2-lazy_paginate').lazy_pagination
+instrument = __import__('instrument')
 
 
 try:
-    for page in lazy_paginator(100):
+    for page in instrument.instrument(lazy_paginator(100), "lazy_pagination"):
         for user in page:
             print(user)
 
 except BrokenPipeError:
     sys.stderr.close()
+
+# GENERATOR_METRICS=- (stderr) or a file path dumps per-stage metrics
+if os.getenv("GENERATOR_METRICS") and not sys.stderr.closed:
+    instrument.dump_metrics()
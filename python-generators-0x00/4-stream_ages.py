@@ -1,30 +1,46 @@
 #!/usr/bin/python3
-users = __import__("0-stream_users").stream_users
+batches = __import__("1-batch_processing").stream_users_in_batches
+aggregate = __import__("aggregate").aggregate
 
 
 def stream_user_ages():
     """
     Generator that yields ages of users one by one.
 
+    Ages are read in columnar batches, so no dict is built per user.
+
     Yields:
-        int: Age of a user.
+        float: Age of a user.
     """
-    for user in users():
-        yield user["age"]
+    for batch in batches(1000, columns=("age",), columnar=True):
+        yield from batch["age"]
 
 
-def calculate_average_age():
+def calculate_average_age(source=None):
     """
-    Calculate the average age of users by consuming the stream_user_ages generator.
+    Calculate the average age of users.
+
+    By default the average is computed by the database, so only the result
+    crosses the network. When a source generator such as stream_user_ages()
+    is given, its ages are averaged in a single streaming pass instead.
+
+    Args:
+        source (iterable): Ages to average, or None to use user_data.
 
     Returns:
         float: The average age of all users. Returns 0 if no users.
     """
-    total_age = 0
-    count = 0
-    for age in stream_user_ages():
-        total_age += age
-        count += 1
-    if count == 0:
-        return 0
-    return total_age / count
+    return aggregate(source, column="age")["avg"]
+
+
+def calculate_age_stats(source=None):
+    """
+    Calculate count, average, min, max, stddev and percentiles of ages.
+
+    Args:
+        source (iterable): Ages to aggregate, or None to use user_data.
+
+    Returns:
+        dict: The statistics, as returned by aggregate.aggregate.
+    """
+    return aggregate(source, column="age")
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+"""
+Async generators streaming the user_data table with aiomysql.
+
+They are the asyncio counterparts of stream_users and
+stream_users_in_batches: a service can run several scans concurrently with
+asyncio.gather instead of dedicating a thread to each one.
+"""
+import asyncio
+
+import aiomysql
+
+pool = __import__('pool')
+seed = __import__('seed')
+keyset_query = __import__('backends').keyset_query
+
+
+async def connect():
+    """Opens an aiomysql connection with the settings from the environment."""
+    params = pool.connection_params()
+    params["db"] = params.pop("database")
+    return await aiomysql.connect(**params)
+
+
+async def async_stream_users(columns=None, chunk_size=1000):
+    """
+    Async generator that yields rows one by one from the user_data table.
+
+    Rows are read from a server-side cursor, chunk_size at a time, and the
+    next chunk is only requested once the consumer has taken the previous
+    one, so a slow consumer holds back the scan instead of buffering it.
+    If the consumer stops early or is cancelled, the connection is closed,
+    which aborts the query on the server instead of draining its rows.
+
+    Args:
+        columns (iterable): Columns to select, or None for all of them.
+        chunk_size (int): Rows fetched per round trip.
+    """
+    query = f"SELECT {seed.select_columns(columns)} FROM user_data"
+    connection = await connect()
+    try:
+        cursor = await connection.cursor(aiomysql.SSDictCursor)
+        await cursor.execute(query)
+        while True:
+            rows = await cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+        await cursor.close()
+    finally:
+        connection.close()
+
+
+async def async_stream_users_in_batches(batch_size, filters=None):
+    """
+    Async generator that yields users in batches.
+
+    Batches are keyset pages on user_id filtered in SQL, exactly as in
+    stream_users_in_batches; each page is fetched when the consumer asks
+    for it.
+
+    Args:
+        batch_size (int): Maximum number of rows per batch.
+        filters (iterable): Filter spec compiled by seed.compile_filters.
+    """
+    connection = await connect()
+    try:
+        last_user_id = None
+        while True:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    *keyset_query(batch_size, last_user_id, filters))
+                batch = await cursor.fetchall()
+            if not batch:
+                break
+            yield batch
+            last_user_id = batch[-1]["user_id"]
+    finally:
+        connection.close()
+
+
+async def count_users():
+    """Counts the rows of user_data by streaming them."""
+    count = 0
+    async for _ in async_stream_users(columns=("user_id",)):
+        count += 1
+    return count
+
+
+async def collect_users_over_25(batch_size=100):
+    """Collects every user older than 25, batch by batch."""
+    users = []
+    async for batch in async_stream_users_in_batches(
+            batch_size, filters=[("age", ">", 25)]):
+        users.extend(batch)
+    return users
+
+
+async def scan_concurrently():
+    """
+    Runs two scans of user_data concurrently with asyncio.gather
+    and prints their results.
+    """
+    total, older_users = await asyncio.gather(
+        count_users(),
+        collect_users_over_25()
+    )
+
+    print(f"Users: {total}")
+    print(f"Users older than 25: {len(older_users)}")
+
+
+# Entry point
+if __name__ == "__main__":
+    asyncio.run(scan_concurrently())
@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+"""
+Parallel range-partitioned scans of the user_data table.
+
+The user_id keyspace is split into ranges that are streamed concurrently,
+each over its own pooled connection, and merged back into one generator.
+"""
+import contextlib
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+backends = __import__('backends')
+handoff = __import__('handoff')
+paginate_users_after = __import__('2-lazy_paginate').paginate_users_after
+aggregate = __import__('aggregate').aggregate
+
+
+def key_ranges(partitions):
+    """
+    Splits the user_id keyspace into contiguous ranges.
+
+    user_ids are UUIDs, so their leading hex digits are spread evenly and
+    the ranges get similar numbers of rows. The first and last ranges are
+    open ended, which keeps every possible key covered.
+
+    Returns:
+        list: (low, high) bounds, low inclusive and high exclusive,
+            None meaning unbounded.
+    """
+    bounds = [f"{i * 0x10000 // partitions:04x}" for i in range(1, partitions)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def range_filters(low, high, filters=None):
+    """Adds the bounds of a key range to a filter spec."""
+    filters = list(filters or ())
+    if low is not None:
+        filters.append(("user_id", ">=", low))
+    if high is not None:
+        filters.append(("user_id", "<", high))
+    return filters
+
+
+def partitioned_scan(partitions=4, ordered=False, page_size=1000,
+                     filters=None, columns=None, buffer_pages=4):
+    """
+    Generator that yields the rows of user_data, scanned in parallel.
+
+    Each key range is read with keyset pages in its own thread; threads
+    spend most of their time waiting on MySQL, which is where the work
+    happens, so the scan scales with the database rather than one socket.
+
+    Args:
+        partitions (int): Number of key ranges scanned concurrently; it
+            should not exceed the connection pool size.
+        ordered (bool): Yield rows in user_id order. Later ranges are still
+            fetched ahead, up to buffer_pages pages each.
+        page_size (int): Rows per keyset page.
+        filters (iterable): Filter spec compiled by seed.compile_filters.
+        columns (iterable): Columns to select, or None for all of them.
+        buffer_pages (int): Pages each range may fetch ahead of the consumer.
+
+    Yields:
+        dict: One row of user_data.
+    """
+    ranges = key_ranges(partitions)
+    stop = threading.Event()
+    if ordered:
+        queues = [queue.Queue(buffer_pages) for _ in ranges]
+    else:
+        queues = [queue.Queue(buffer_pages * len(ranges))] * len(ranges)
+
+    executor = ThreadPoolExecutor(max_workers=len(ranges))
+    try:
+        for (low, high), out in zip(ranges, queues):
+            executor.submit(_scan_range, range_filters(low, high, filters),
+                            page_size, columns, out, stop)
+
+        if ordered:
+            for out in queues:
+                yield from _drain(out, 1)
+        else:
+            yield from _drain(queues[0], len(ranges))
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+
+def partitioned_average_age(partitions=4):
+    """Average age of all users, streamed with a partitioned scan."""
+    ages = (user["age"]
+            for user in partitioned_scan(partitions, columns=("age",)))
+    return aggregate(ages)["avg"]
+
+
+def _scan_range(filters, page_size, columns, out, stop):
+    """Worker: streams one key range into out until done or stopped."""
+    try:
+        connection = backends.get_backend().connect()
+        with contextlib.closing(connection):
+            last_user_id = None
+            while not stop.is_set():
+                rows = paginate_users_after(connection, page_size,
+                                            last_user_id, filters, columns)
+                if not rows:
+                    break
+                handoff.put(out, rows, stop)
+                last_user_id = rows[-1]["user_id"]
+    except Exception as e:
+        handoff.put(out, e, stop)
+    finally:
+        handoff.put(out, handoff.DONE, stop)
+
+
+def _drain(out, producers):
+    """Yields the rows put in out until every producer is done."""
+    done = 0
+    while done < producers:
+        item = out.get()
+        if item is handoff.DONE:
+            done += 1
+        elif isinstance(item, Exception):
+            raise item
+        else:
+            yield from item
+
+
+# Entry point
+if __name__ == "__main__":
+    print(f"Average age: {partitioned_average_age()}")
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+"""
+Export user_data to compressed columnar files, and read them back.
+
+Rows are streamed in columnar batches and every batch is written as soon
+as it arrives (one Parquet row group, or one Arrow IPC record batch), so
+memory use is bounded by the batch size, not by the table size.
+"""
+import sys
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+stream_users_in_batches = __import__(
+    '1-batch_processing').stream_users_in_batches
+
+# Arrow schema of the exported user_data columns
+USER_DATA_SCHEMA = pa.schema([
+    ("user_id", pa.string()),
+    ("name", pa.string()),
+    ("email", pa.string()),
+    ("age", pa.float64()),
+])
+
+# Export formats, by file extension
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".arrows": "arrow"}
+
+
+def export_user_data(path, file_format=None, batch_size=65536,
+                     compression="zstd", filters=None):
+    """
+    Streams user_data into a Parquet file or an Arrow IPC stream.
+
+    Args:
+        path (str): Output file.
+        file_format (str): "parquet" or "arrow", guessed from the file
+            extension when omitted.
+        batch_size (int): Rows per row group / record batch.
+        compression (str): Codec, e.g. "zstd", "lz4" or None.
+        filters (iterable): Filter spec compiled by seed.compile_filters.
+
+    Returns:
+        int: Number of rows written.
+    """
+    file_format = file_format or _guess_format(path)
+    if file_format == "parquet":
+        writer = pq.ParquetWriter(path, USER_DATA_SCHEMA,
+                                  compression=compression)
+    elif file_format == "arrow":
+        options = ipc.IpcWriteOptions(compression=compression)
+        writer = ipc.new_stream(path, USER_DATA_SCHEMA, options=options)
+    else:
+        raise ValueError(f"Unsupported export format: {file_format!r}")
+
+    rows = 0
+    with writer:
+        for batch in stream_users_in_batches(batch_size, filters=filters,
+                                             columnar=True):
+            record_batch = pa.record_batch(
+                [pa.array(batch[field.name], type=field.type)
+                 for field in USER_DATA_SCHEMA],
+                schema=USER_DATA_SCHEMA
+            )
+            writer.write_batch(record_batch)
+            rows += record_batch.num_rows
+    return rows
+
+
+def iter_export(path, file_format=None, columns=None):
+    """
+    Generator that yields the record batches of an exported file.
+
+    The file is memory-mapped, so only the batch being read is
+    decompressed into memory.
+
+    Args:
+        path (str): File written by export_user_data.
+        file_format (str): "parquet" or "arrow", guessed when omitted.
+        columns (list): Columns to read, or None for all of them
+            (Parquet only reads the requested columns from disk).
+    """
+    file_format = file_format or _guess_format(path)
+    if file_format == "parquet":
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        yield from parquet_file.iter_batches(columns=columns)
+    elif file_format == "arrow":
+        with pa.memory_map(path) as source:
+            for record_batch in ipc.open_stream(source):
+                if columns is not None:
+                    record_batch = record_batch.select(columns)
+                yield record_batch
+    else:
+        raise ValueError(f"Unsupported export format: {file_format!r}")
+
+
+def read_export(path, file_format=None, columns=None):
+    """Reads a whole exported file into a pyarrow Table."""
+    batches = list(iter_export(path, file_format, columns))
+    if not batches:
+        schema = USER_DATA_SCHEMA
+        if columns is not None:
+            schema = pa.schema([schema.field(name) for name in columns])
+        return schema.empty_table()
+    return pa.Table.from_batches(batches)
+
+
+def _guess_format(path):
+    """Returns the export format matching the extension of path."""
+    for extension, file_format in FORMATS.items():
+        if path.endswith(extension):
+            return file_format
+    raise ValueError(f"Cannot guess the export format of {path!r}")
+
+
+# Entry point
+if __name__ == "__main__":
+    output = sys.argv[1] if len(sys.argv) > 1 else "user_data.parquet"
+    print(f"Exported {export_user_data(output)} rows to {output}")
@@ -0,0 +1,259 @@
+#!/usr/bin/python3
+"""
+Aggregators computing summary statistics of a numeric user_data column.
+
+SqlAggregator pushes the work into the database so only the results cross
+the network; StreamingAggregator computes the same statistics in a single
+pass over any iterable of numbers, for sources that are not a table.
+"""
+import math
+
+backends = __import__('backends')
+seed = __import__('seed')
+
+# Percentiles reported by default
+DEFAULT_PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def aggregate(source=None, column="age", percentiles=DEFAULT_PERCENTILES):
+    """
+    Computes count, avg, min, max, stddev and percentiles.
+
+    Args:
+        source (iterable): Numbers to aggregate, or None to aggregate
+            the column directly in the database.
+        column (str): Numeric user_data column used when source is None.
+        percentiles (tuple): Fractions between 0 and 1 to report.
+
+    Returns:
+        dict: The statistics; avg is 0 and the others None when empty.
+    """
+    if source is None:
+        return SqlAggregator(column, percentiles).result()
+    return StreamingAggregator(percentiles).consume(source)
+
+
+class SqlAggregator:
+    """
+    Aggregates a user_data column with SQL.
+
+    Count, average, bounds and standard deviation come from a single
+    aggregate query. Percentiles are exact nearest-rank values found in
+    the distribution of the column, read with one GROUP BY query. A
+    DECIMAL(5,2) column allows 199,999 distinct values; the result stays
+    small only because ages are validated to MIN_AGE..MAX_AGE (0 to 150)
+    when loaded, leaving at most 15,001 of them however many rows the
+    table holds, so all percentiles cost one index scan.
+    """
+
+    def __init__(self, column="age", percentiles=DEFAULT_PERCENTILES,
+                 connect=None):
+        """
+        Args:
+            column (str): Numeric user_data column to aggregate.
+            percentiles (tuple): Fractions between 0 and 1 to report.
+            connect (callable): Returns a new connection, defaults to
+                the connect of the configured backend.
+
+        Raises:
+            ValueError: If column is not in seed.NUMERIC_COLUMNS.
+        """
+        if column not in seed.NUMERIC_COLUMNS:
+            raise ValueError(f"Not a numeric user_data column: {column!r}")
+        self.column = column
+        self.percentiles = percentiles
+        self.backend = backends.get_backend()
+        self.connect = connect or self.backend.connect
+
+    def result(self):
+        """Runs the aggregate queries and returns the statistics."""
+        column = self.column
+        connection = self.connect()
+        try:
+            _, rows = self.backend.fetch_tuples(
+                connection,
+                f"SELECT COUNT({column}), AVG({column}), MIN({column}), "
+                f"MAX({column}), STDDEV_POP({column}) FROM user_data"
+            )
+            count, avg, low, high, stddev = rows[0]
+
+            values = {}
+            if count and self.percentiles:
+                _, distribution = self.backend.fetch_tuples(
+                    connection,
+                    f"SELECT {column}, COUNT(*) FROM user_data WHERE "
+                    f"{column} IS NOT NULL GROUP BY {column} "
+                    f"ORDER BY {column}"
+                )
+                values = _percentiles(distribution, count, self.percentiles)
+        finally:
+            connection.close()
+
+        return _stats(count, avg, low, high, stddev, values)
+
+
+class StreamingAggregator:
+    """
+    Aggregates numbers in one pass with constant memory.
+
+    Mean and variance use Welford's algorithm, which stays numerically
+    stable over long streams; percentiles come from a t-digest.
+    """
+
+    def __init__(self, percentiles=DEFAULT_PERCENTILES, compression=100):
+        """
+        Args:
+            percentiles (tuple): Fractions between 0 and 1 to report.
+            compression (int): t-digest compression; higher is more
+                accurate and uses more memory.
+        """
+        self.percentiles = percentiles
+        self.count = 0
+        self.mean = 0.0
+        self.min = None
+        self.max = None
+        self._m2 = 0.0
+        self._digest = TDigest(compression)
+
+    def add(self, value):
+        """Adds one number to the aggregate."""
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self._digest.add(value)
+
+    def consume(self, values):
+        """Adds every number of values and returns the statistics."""
+        for value in values:
+            self.add(value)
+        return self.result()
+
+    def result(self):
+        """Returns the statistics of the numbers added so far."""
+        if not self.count:
+            return _stats(0, None, None, None, None, {})
+        values = {
+            p: min(max(self._digest.quantile(p), self.min), self.max)
+            for p in self.percentiles
+        }
+        stddev = math.sqrt(self._m2 / self.count)
+        return _stats(self.count, self.mean, self.min, self.max, stddev,
+                      values)
+
+
+class TDigest:
+    """
+    Merging t-digest for approximate quantiles of a stream.
+
+    Values are buffered and periodically merged into centroids whose size
+    is bounded by the arcsine scale function, so the tails stay precise.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self._centroids = []
+        self._buffer = []
+
+    def add(self, value):
+        """Adds one value to the digest."""
+        self._buffer.append(value)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def quantile(self, q):
+        """Returns the approximate q quantile, or None if empty."""
+        self._compress()
+        centroids = self._centroids
+        if not centroids:
+            return None
+        if len(centroids) == 1:
+            return centroids[0][0]
+
+        target = q * sum(weight for _, weight in centroids)
+        cumulative = 0.0
+        previous_mean, previous_mid = centroids[0][0], 0.0
+        for mean, weight in centroids:
+            mid = cumulative + weight / 2
+            if target < mid:
+                if mid == previous_mid:
+                    return mean
+                fraction = (target - previous_mid) / (mid - previous_mid)
+                return previous_mean + (mean - previous_mean) * fraction
+            cumulative += weight
+            previous_mean, previous_mid = mean, mid
+        return centroids[-1][0]
+
+    def _scale(self, q):
+        """Arcsine scale function k(q)."""
+        q = min(max(q, 0.0), 1.0)
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _compress(self):
+        """Merges the buffered values into the centroids."""
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + [(v, 1.0) for v in self._buffer])
+        self._buffer = []
+
+        total = sum(weight for _, weight in points)
+        merged = []
+        mean, weight = points[0]
+        before = 0.0
+        k_start = self._scale(0.0)
+        for point_mean, point_weight in points[1:]:
+            q_end = (before + weight + point_weight) / total
+            if self._scale(q_end) - k_start <= 1.0:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+            else:
+                merged.append((mean, weight))
+                before += weight
+                k_start = self._scale(before / total)
+                mean, weight = point_mean, point_weight
+        merged.append((mean, weight))
+        self._centroids = merged
+
+
+def _nearest_rank(p, count):
+    """Zero based offset of the nearest-rank p percentile of count rows."""
+    return min(max(math.ceil(p * count) - 1, 0), count - 1)
+
+
+def _percentiles(distribution, count, percentiles):
+    """
+    Nearest-rank percentiles from (value, count) pairs in value order.
+
+    Returns:
+        dict: Each of percentiles mapped to its value, as a float.
+    """
+    ranks = sorted((_nearest_rank(p, count), p) for p in percentiles)
+    values = {}
+    seen = 0
+    pairs = iter(distribution)
+    for rank, p in ranks:
+        while seen <= rank:
+            value, occurrences = next(pairs)
+            seen += occurrences
+        values[p] = float(value)
+    return {p: values[p] for p in percentiles}
+
+
+def _stats(count, avg, low, high, stddev, percentiles):
+    """Builds the result dict shared by every aggregator."""
+    def as_float(value):
+        return None if value is None else float(value)
+
+    return {
+        "count": count,
+        "avg": float(avg) if count else 0,
+        "min": as_float(low),
+        "max": as_float(high),
+        "stddev": as_float(stddev),
+        "percentiles": percentiles,
+    }
@@ -0,0 +1,382 @@
+#!/usr/bin/python3
+"""
+Database backends for the generator modules.
+
+A backend hides the driver behind the few operations the modules need:
+opening a connection, streaming a query, fetching a keyset page and bulk
+inserting users. MySQLBackend uses pymysql and the shared connection pool;
+SQLiteBackend uses an embedded database file, for tests and edge
+deployments. DB_BACKEND selects one ("mysql", the default, or "sqlite").
+
+Queries are written with %s placeholders; the SQLite backend rewrites
+them to its own ? style.
+"""
+import math
+import os
+import sqlite3
+import threading
+from decimal import Decimal
+
+import pymysql
+from dotenv import load_dotenv
+
+pool = __import__('pool')
+seed = __import__('seed')
+
+# Load environment variables from .env file
+load_dotenv()
+
+# SQLite stores ages as NUMERIC; hand it Decimals as text
+sqlite3.register_adapter(Decimal, str)
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the backend configured by DB_BACKEND.
+
+    For SQLite the database file is SQLITE_PATH (default ALX_prodev.db).
+    """
+    name = os.getenv("DB_BACKEND", "mysql").lower()
+    if name == "mysql":
+        key = (name,)
+    elif name == "sqlite":
+        key = (name, os.getenv("SQLITE_PATH", "ALX_prodev.db"))
+    else:
+        raise ValueError(f"Unknown DB_BACKEND: {name!r}")
+
+    with _backends_lock:
+        if key not in _backends:
+            if name == "mysql":
+                _backends[key] = MySQLBackend()
+            else:
+                _backends[key] = SQLiteBackend(key[1])
+        return _backends[key]
+
+
+def keyset_query(page_size, last_user_id=None, filters=None, columns=None):
+    """
+    Builds the query of the keyset page following last_user_id.
+
+    Returns:
+        tuple: The SQL and its parameters.
+    """
+    if columns is not None and "user_id" not in columns:
+        columns = ("user_id", *columns)
+    condition, params = seed.compile_filters(filters)
+    conditions = [condition] if condition else []
+    if last_user_id is not None:
+        conditions.append("user_id > %s")
+        params.append(last_user_id)
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    return (f"SELECT {seed.select_columns(columns)} FROM user_data "
+            f"{where}ORDER BY user_id LIMIT %s",
+            (*params, page_size))
+
+
+class Backend:
+    """
+    Operations the generator modules run against a database.
+
+    Subclasses implement connect, stream, fetch_all, fetch_tuples,
+    bulk_insert and create_schema; the rest is built on top of them.
+    """
+
+    name = None
+
+    def connect(self):
+        """Returns a connection; closing it releases it."""
+        raise NotImplementedError
+
+    def stream(self, connection, query, params=(), chunk_size=1000,
+               buffered=False, discard_early=False):
+        """
+        Generator that yields the rows of query as dictionaries.
+
+        Args:
+            connection: A connection from connect().
+            query (str): SQL with %s placeholders.
+            params (tuple): Parameters of the query.
+            chunk_size (int): Rows fetched per round trip.
+            buffered (bool): Allow the driver to load the whole result
+                before the first row; otherwise rows are read as they are
+                consumed.
+            discard_early (bool): If the generator is closed before the
+                last row, discard connection instead of reading the rest
+                of the result. Only for a pooled connection the caller
+                checked out for this stream alone.
+        """
+        raise NotImplementedError
+
+    def fetch_all(self, connection, query, params=()):
+        """Returns every row of query as a dictionary."""
+        raise NotImplementedError
+
+    def fetch_tuples(self, connection, query, params=()):
+        """
+        Returns the rows of query as tuples, without a dict per row.
+
+        Returns:
+            tuple: The column names and the list of rows.
+        """
+        raise NotImplementedError
+
+    def bulk_insert(self, connection, rows, on_duplicate="ignore"):
+        """
+        Inserts user rows in one statement batch, without committing.
+
+        Args:
+            connection: A connection from connect().
+            rows (list): Dicts with user_id, name, email and age.
+            on_duplicate (str): "ignore" keeps existing rows, "update"
+                overwrites them.
+        """
+        raise NotImplementedError
+
+    def create_schema(self, connection):
+        """Creates user_data and its indexes if they do not exist."""
+        raise NotImplementedError
+
+    def keyset_page(self, connection, page_size, last_user_id=None,
+                    filters=None, columns=None):
+        """Returns the keyset page following last_user_id, as dicts."""
+        return self.fetch_all(connection, *keyset_query(
+            page_size, last_user_id, filters, columns))
+
+    def keyset_columns(self, connection, page_size, last_user_id=None,
+                       filters=None, columns=None):
+        """Returns the keyset page following last_user_id, as tuples."""
+        return self.fetch_tuples(connection, *keyset_query(
+            page_size, last_user_id, filters, columns))
+
+    def existing_user_ids(self, connection, user_ids):
+        """Returns which of user_ids are already in user_data, in one query."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        _, rows = self.fetch_tuples(
+            connection,
+            f"SELECT user_id FROM user_data WHERE user_id IN ({placeholders})",
+            user_ids
+        )
+        return {row[0] for row in rows}
+
+    def clear(self, connection):
+        """Deletes every row of user_data."""
+        raise NotImplementedError
+
+
+class MySQLBackend(Backend):
+    """
+    MySQL through pymysql and the shared connection pool.
+
+    Streaming uses server-side cursors read with fetchmany, and bulk
+    inserts use executemany, which pymysql sends as multi-row INSERTs. An
+    unbuffered stream closed before its last row with discard_early
+    discards its connection rather than draining the rest of the table
+    into the client.
+    """
+
+    name = "mysql"
+
+    def connect(self):
+        return pool.get_pool().acquire()
+
+    def stream(self, connection, query, params=(), chunk_size=1000,
+               buffered=False, discard_early=False):
+        if buffered:
+            cursorclass = pymysql.cursors.DictCursor
+        else:
+            cursorclass = pymysql.cursors.SSDictCursor
+        cursor = connection.cursor(cursorclass)
+        finished = False
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchmany(chunk_size)
+            while rows:
+                yield from rows
+                rows = cursor.fetchmany(chunk_size)
+            finished = True
+        finally:
+            if finished or buffered or not discard_early:
+                cursor.close()
+            else:
+                # Closing a server-side cursor reads the rest of its result
+                # set; closing the connection aborts the query instead
+                connection.discard()
+
+    def fetch_all(self, connection, query, params=()):
+        with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def fetch_tuples(self, connection, query, params=()):
+        with connection.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            return [d[0] for d in cursor.description], rows
+
+    def bulk_insert(self, connection, rows, on_duplicate="ignore"):
+        if on_duplicate == "update":
+            insert_query = """
+            INSERT INTO user_data (user_id, name, email, age)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                name = VALUES(name), email = VALUES(email), age = VALUES(age)
+            """
+        else:
+            insert_query = """
+            INSERT IGNORE INTO user_data (user_id, name, email, age)
+            VALUES (%s, %s, %s, %s)
+            """
+        with connection.cursor() as cursor:
+            cursor.executemany(insert_query, _user_values(rows))
+
+    def create_schema(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_data (
+                user_id CHAR(36) PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                email VARCHAR(255) NOT NULL,
+                age DECIMAL(5,2) NOT NULL,
+                INDEX (user_id),
+                INDEX idx_user_data_age (age)
+            )
+            """)
+            # Tables created before the age index existed do not get it
+            # from CREATE TABLE IF NOT EXISTS
+            cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = 'user_data'
+                AND index_name = 'idx_user_data_age'
+            """)
+            if cursor.fetchone()[0] == 0:
+                cursor.execute(
+                    "CREATE INDEX idx_user_data_age ON user_data (age)")
+
+    def clear(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("TRUNCATE TABLE user_data")
+
+
+class SQLiteBackend(Backend):
+    """
+    An embedded SQLite database file.
+
+    Connections are opened in WAL mode with synchronous=NORMAL, so readers
+    do not block the writer and commits do not wait for a full fsync, and
+    keep a cache of prepared statements. Bulk inserts run one executemany,
+    which reuses a single prepared statement for the whole batch.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, cached_statements=256,
+                                     check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.create_aggregate("STDDEV_POP", 1, _StddevPop)
+        connection.row_factory = _dict_row
+        return connection
+
+    def stream(self, connection, query, params=(), chunk_size=1000,
+               buffered=False, discard_early=False):
+        # SQLite steps through the result as it is fetched either way
+        cursor = connection.execute(_qmark(query), params)
+        try:
+            rows = cursor.fetchmany(chunk_size)
+            while rows:
+                yield from rows
+                rows = cursor.fetchmany(chunk_size)
+        finally:
+            cursor.close()
+
+    def fetch_all(self, connection, query, params=()):
+        return connection.execute(_qmark(query), params).fetchall()
+
+    def fetch_tuples(self, connection, query, params=()):
+        cursor = connection.cursor()
+        cursor.row_factory = None
+        cursor.execute(_qmark(query), params)
+        rows = cursor.fetchall()
+        return [d[0] for d in cursor.description], rows
+
+    def bulk_insert(self, connection, rows, on_duplicate="ignore"):
+        if on_duplicate == "update":
+            insert_query = """
+            INSERT INTO user_data (user_id, name, email, age)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                name = excluded.name, email = excluded.email, age = excluded.age
+            """
+        else:
+            insert_query = """
+            INSERT OR IGNORE INTO user_data (user_id, name, email, age)
+            VALUES (?, ?, ?, ?)
+            """
+        connection.executemany(insert_query, _user_values(rows))
+
+    def create_schema(self, connection):
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id CHAR(36) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            age DECIMAL(5,2) NOT NULL
+        )
+        """)
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_user_data_age ON user_data (age)")
+        connection.commit()
+
+    def clear(self, connection):
+        connection.execute("DELETE FROM user_data")
+        connection.commit()
+
+
+class _StddevPop:
+    """SQLite aggregate matching MySQL's STDDEV_POP, with Welford updates."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def finalize(self):
+        return math.sqrt(self.m2 / self.count) if self.count else None
+
+
+def _user_values(rows):
+    """Parameter tuples of user rows, in user_data column order."""
+    return [
+        (row.get('user_id') or seed.row_user_id(row),
+         row['name'], row['email'], row['age'])
+        for row in rows
+    ]
+
+
+def _qmark(query):
+    """Rewrites %s placeholders into SQLite's ? style."""
+    return query.replace("%s", "?")
+
+
+def _dict_row(cursor, row):
+    """SQLite row factory returning dictionaries, like pymysql DictCursor."""
+    return {d[0]: value for d, value in zip(cursor.description, row)}
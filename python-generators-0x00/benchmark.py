@@ -0,0 +1,279 @@
+#!/usr/bin/python3
+"""
+Benchmarks for the user_data data paths.
+
+Each benchmark prints one JSON document per measured mode so runs can be
+compared or kept alongside the table size they were taken on.
+
+Usage:
+    ./benchmark.py stream-rss [--chunk-size N]
+    ./benchmark.py loaders [--csv PATH] [--batch-size N] [--workers N]
+    ./benchmark.py pushdown [--batch-size N]
+    ./benchmark.py batch-format [--rows N] [--batch-size N] [--columns C ...]
+
+The loaders benchmark empties user_data before each run, so point .env at
+a scratch database.
+"""
+import argparse
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import pymysql
+
+seed = __import__('seed')
+stream_users = __import__('0-stream_users').stream_users
+batch_processing = __import__('1-batch_processing')
+
+# Row counts at which the resident set size is sampled
+RSS_CHECKPOINTS = (10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def current_rss():
+    """Returns the resident set size of the current process in bytes."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def benchmark_stream_rss(unbuffered, chunk_size=1000,
+                         checkpoints=RSS_CHECKPOINTS):
+    """
+    Streams the whole user_data table and samples RSS along the way.
+
+    Args:
+        unbuffered (bool): Mode passed through to stream_users.
+        chunk_size (int): Rows per fetch in unbuffered mode.
+        checkpoints (tuple): Row counts at which RSS is sampled.
+
+    Returns:
+        dict: Rows streamed, total time and the RSS growth at each checkpoint.
+    """
+    baseline = current_rss()
+    pending = list(checkpoints)
+    samples = []
+    rows = 0
+    start = time.perf_counter()
+    for rows, _ in enumerate(stream_users(unbuffered=unbuffered,
+                                          chunk_size=chunk_size), 1):
+        if pending and rows == pending[0]:
+            pending.pop(0)
+            samples.append({
+                "rows": rows,
+                "rss_growth_mb": (current_rss() - baseline) / 2**20,
+                "elapsed_s": time.perf_counter() - start,
+            })
+    growth = [sample["rss_growth_mb"] for sample in samples]
+    return {
+        "benchmark": "stream_rss",
+        "mode": "unbuffered" if unbuffered else "buffered",
+        "rows": rows,
+        "elapsed_s": time.perf_counter() - start,
+        "rss_spread_mb": max(growth) - min(growth) if growth else 0.0,
+        "samples": samples,
+    }
+
+
+def benchmark_loader(loader, file_path, **kwargs):
+    """
+    Times one CSV loader on an empty user_data table.
+
+    Args:
+        loader (str): Name of the seed function to run.
+        file_path (str): CSV file to load.
+        **kwargs: Extra arguments for the loader.
+
+    Returns:
+        dict: Rows in the table afterwards, elapsed time and rows/sec.
+    """
+    connection = seed.connect_to_prodev()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("TRUNCATE TABLE user_data")
+
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull):
+            if loader == "parallel_load_csv_data":
+                seed.parallel_load_csv_data(file_path, **kwargs)
+            else:
+                getattr(seed, loader)(connection, file_path, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM user_data")
+            rows = cursor.fetchone()[0]
+    finally:
+        connection.close()
+    return {
+        "benchmark": "loaders",
+        "loader": loader,
+        "rows": rows,
+        "elapsed_s": elapsed,
+        "rows_per_s": rows / elapsed if elapsed else 0.0,
+    }
+
+
+def benchmark_pushdown(batch_size=50, filters=batch_processing.OVER_25):
+    """
+    Compares filtering in Python after OFFSET paging (the former
+    batch_processing) with filters compiled into the WHERE clause.
+
+    Returns:
+        list: One result per strategy with rows transferred, rows matched
+            and elapsed time.
+    """
+    condition, params = seed.compile_filters(filters)
+    results = []
+
+    connection = seed.connect_to_prodev()
+    try:
+        start = time.perf_counter()
+        transferred = matched = 0
+        with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.execute("SELECT COUNT(*) AS total FROM user_data")
+            total = cursor.fetchone()["total"]
+            for offset in range(0, total, batch_size):
+                cursor.execute("SELECT * FROM user_data LIMIT %s OFFSET %s",
+                               (batch_size, offset))
+                batch = cursor.fetchall()
+                transferred += len(batch)
+                matched += sum(1 for user in batch
+                               if _matches(user, filters))
+        results.append({
+            "benchmark": "pushdown",
+            "strategy": "offset_python_filter",
+            "rows_transferred": transferred,
+            "rows_matched": matched,
+            "elapsed_s": time.perf_counter() - start,
+        })
+    finally:
+        connection.close()
+
+    start = time.perf_counter()
+    transferred = 0
+    for batch in batch_processing.stream_users_in_batches(batch_size,
+                                                          filters):
+        transferred += len(batch)
+    results.append({
+        "benchmark": "pushdown",
+        "strategy": "keyset_sql_filter",
+        "where": condition,
+        "params": params,
+        "rows_transferred": transferred,
+        "rows_matched": transferred,
+        "elapsed_s": time.perf_counter() - start,
+    })
+    return results
+
+
+def _matches(user, filters):
+    """Evaluates a filter spec in Python, as the reference strategy."""
+    checks = dict(batch_processing.COMPARISONS,
+                  **{"in": lambda value, values: value in values})
+    return all(checks[op.lower()](user[column], value)
+               for column, op, value in filters)
+
+
+def benchmark_batch_format(columnar, rows=1_000_000, batch_size=1000,
+                           columns=None):
+    """
+    Measures one stream_users_in_batches output format.
+
+    Throughput is taken over the first rows rows; memory is what a single
+    batch keeps allocated, as traced by tracemalloc.
+
+    Returns:
+        dict: Rows read, rows/sec and the bytes held by one batch.
+    """
+    batches = batch_processing.stream_users_in_batches(
+        batch_size, columns=columns, columnar=columnar)
+    read = 0
+    start = time.perf_counter()
+    for batch in islice(batches, -(-rows // batch_size)):
+        read += len(batch["user_id"]) if columnar else len(batch)
+    elapsed = time.perf_counter() - start
+    batches.close()
+
+    batches = batch_processing.stream_users_in_batches(
+        batch_size, columns=columns, columnar=columnar)
+    tracemalloc.start()
+    first = next(batches, None)
+    batch_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    batches.close()
+    del first
+
+    return {
+        "benchmark": "batch_format",
+        "format": "columnar" if columnar else "rows",
+        "columns": columns,
+        "rows": read,
+        "elapsed_s": elapsed,
+        "rows_per_s": read / elapsed if elapsed else 0.0,
+        "batch_size": batch_size,
+        "batch_bytes": batch_bytes,
+    }
+
+
+def run_isolated(func, *args, **kwargs):
+    """Runs func in a fresh worker process so RSS readings do not leak."""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(func, *args, **kwargs).result()
+
+
+def main():
+    """Parses the command line and runs the selected benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    stream_rss = subparsers.add_parser(
+        "stream-rss", help="RSS of stream_users, buffered vs unbuffered")
+    stream_rss.add_argument("--chunk-size", type=int, default=1000)
+
+    loaders = subparsers.add_parser(
+        "loaders", help="rows/sec of the row-by-row, batched and parallel "
+                        "CSV loaders")
+    loaders.add_argument("--csv", default="user_data.csv")
+    loaders.add_argument("--batch-size", type=int, default=1000)
+    loaders.add_argument("--workers", type=int, default=os.cpu_count())
+
+    pushdown = subparsers.add_parser(
+        "pushdown", help="rows transferred by batch_processing, Python "
+                         "filtering vs SQL WHERE")
+    pushdown.add_argument("--batch-size", type=int, default=50)
+
+    batch_format = subparsers.add_parser(
+        "batch-format", help="row dicts vs columnar batches")
+    batch_format.add_argument("--rows", type=int, default=1_000_000)
+    batch_format.add_argument("--batch-size", type=int, default=1000)
+    batch_format.add_argument("--columns", nargs="+")
+
+    args = parser.parse_args()
+    if args.benchmark == "stream-rss":
+        for unbuffered in (True, False):
+            result = run_isolated(benchmark_stream_rss, unbuffered,
+                                  args.chunk_size)
+            print(json.dumps(result))
+    elif args.benchmark == "loaders":
+        print(json.dumps(benchmark_loader("load_csv_data", args.csv)))
+        print(json.dumps(benchmark_loader(
+            "bulk_load_csv_data", args.csv, batch_size=args.batch_size)))
+        print(json.dumps(benchmark_loader(
+            "parallel_load_csv_data", args.csv, workers=args.workers,
+            batch_size=args.batch_size)))
+    elif args.benchmark == "pushdown":
+        for result in benchmark_pushdown(args.batch_size):
+            print(json.dumps(result))
+    elif args.benchmark == "batch-format":
+        for columnar in (False, True):
+            print(json.dumps(run_isolated(
+                benchmark_batch_format, columnar, args.rows,
+                args.batch_size, args.columns)))
+
+
+if __name__ == "__main__":
+    main()
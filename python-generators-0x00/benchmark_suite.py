@@ -0,0 +1,316 @@
+#!/usr/bin/python3
+"""
+Reproducible benchmark suite for the user_data data paths.
+
+For each table size, a scratch database is seeded with the same synthetic
+users, then every case below runs in a fresh process and reports its
+throughput, peak RSS and the number of queries the server received.
+Results can be stored as a baseline and later runs compared against it.
+
+Usage:
+    ./benchmark_suite.py [--sizes N ...] [--database NAME]
+                         [--save-baseline PATH] [--baseline PATH]
+
+The suite drops and reseeds user_data in --database (default
+ALX_prodev_bench), never in the database configured in .env. With
+DB_BACKEND=sqlite the scratch database is the file <database>.db, and
+query counts are not reported.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+
+import pymysql
+
+backends = __import__('backends')
+pool = __import__('pool')
+seed = __import__('seed')
+benchmark = __import__('benchmark')
+
+# Table sizes benchmarked by default
+DEFAULT_SIZES = (10_000, 1_000_000, 10_000_000)
+
+# Above this size, cases whose cost grows quadratically are skipped
+MAX_QUADRATIC_SIZE = 100_000
+
+# Relative change past which a metric counts as a regression
+DEFAULT_TOLERANCE = 0.10
+
+
+def synthetic_users(count, random_seed=0):
+    """Generator of count deterministic synthetic user rows."""
+    rng = random.Random(random_seed)
+    for i in range(count):
+        yield {
+            "name": f"User {i}",
+            "email": f"user{i}@example.com",
+            "age": str(rng.randint(18, 100)),
+        }
+
+
+def use_scratch_database(database):
+    """
+    Creates database if needed and points every connection at it.
+
+    Must run before the first pooled connection is opened.
+    """
+    if not re.fullmatch(r"\w+", database):
+        raise ValueError(f"Invalid database name: {database!r}")
+    if backends.get_backend().name == "sqlite":
+        os.environ["SQLITE_PATH"] = f"{database}.db"
+        return
+    params = pool.connection_params()
+    params.pop("database")
+    connection = pymysql.connect(**params)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+    finally:
+        connection.close()
+    os.environ["MYSQL_DB"] = database
+
+
+def reseed(size):
+    """Empties user_data and loads size synthetic users into it."""
+    backend = backends.get_backend()
+    with contextlib.redirect_stdout(io.StringIO()):
+        connection = seed.connect_to_prodev()
+        backend.create_schema(connection)
+    try:
+        backend.clear(connection)
+        seed.load_rows(connection, synthetic_users(size), batch_size=5000)
+    finally:
+        connection.close()
+
+
+def query_count():
+    """
+    Number of statements the server has received so far, or None when the
+    backend does not count them (SQLite).
+    """
+    if backends.get_backend().name != "mysql":
+        return None
+    connection = seed.connect_to_prodev()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+            return int(cursor.fetchone()[1])
+    finally:
+        connection.close()
+
+
+class _LineCounter(io.TextIOBase):
+    """Text stream that only counts the lines written to it."""
+
+    def __init__(self):
+        self.lines = 0
+
+    def write(self, text):
+        self.lines += text.count("\n")
+        return len(text)
+
+
+def _stream_users(size):
+    stream_users = __import__('0-stream_users').stream_users
+    return sum(1 for _ in stream_users(unbuffered=True))
+
+
+def _stream_users_buffered(size):
+    stream_users = __import__('0-stream_users').stream_users
+    return sum(1 for _ in stream_users())
+
+
+def _batch_processing(size):
+    batch_processing = __import__('1-batch_processing').batch_processing
+    counter = _LineCounter()
+    with contextlib.redirect_stdout(counter):
+        batch_processing(50)
+    return counter.lines
+
+
+def _lazy_pagination_keyset(size):
+    lazy_pagination = __import__('2-lazy_paginate').lazy_pagination
+    return sum(len(page) for page in lazy_pagination(100, keyset=True))
+
+
+def _lazy_pagination_offset(size):
+    lazy_pagination = __import__('2-lazy_paginate').lazy_pagination
+    return sum(len(page) for page in lazy_pagination(100))
+
+
+def _average_age_sql(size):
+    return __import__('4-stream_ages').calculate_age_stats()["count"]
+
+
+def _average_age_streaming(size):
+    stream_ages = __import__('4-stream_ages')
+    stats = stream_ages.calculate_age_stats(stream_ages.stream_user_ages())
+    return stats["count"]
+
+
+def _load_csv_data(size):
+    return _load_csv(size, seed.load_csv_data)
+
+
+def _bulk_load_csv_data(size):
+    return _load_csv(size, seed.bulk_load_csv_data)
+
+
+def _load_csv(size, loader):
+    """
+    Reloads the synthetic users from a CSV file with loader; returns the
+    rows the table holds afterwards, so a loader that silently fails is
+    not reported as fast.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "user_data.csv")
+        with open(path, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.DictWriter(csv_file, ["name", "email", "age"])
+            writer.writeheader()
+            writer.writerows(synthetic_users(size))
+
+        backend = backends.get_backend()
+        connection = seed.connect_to_prodev()
+        try:
+            backend.clear(connection)
+            loader(connection, path)
+            _, rows = backend.fetch_tuples(
+                connection, "SELECT COUNT(*) FROM user_data")
+        finally:
+            connection.close()
+    return rows[0][0]
+
+
+# name: (case, whether its cost grows quadratically with the table)
+CASES = {
+    "stream_users": (_stream_users, False),
+    "stream_users_buffered": (_stream_users_buffered, False),
+    "batch_processing": (_batch_processing, False),
+    "lazy_pagination_keyset": (_lazy_pagination_keyset, False),
+    "lazy_pagination_offset": (_lazy_pagination_offset, True),
+    "calculate_average_age_sql": (_average_age_sql, False),
+    "calculate_average_age_streaming": (_average_age_streaming, False),
+    # The loaders truncate user_data, so they run last
+    "bulk_load_csv_data": (_bulk_load_csv_data, False),
+    "load_csv_data": (_load_csv_data, True),
+}
+
+
+def run_case(name, size):
+    """
+    Runs one case in the current process.
+
+    Returns:
+        dict: Rows handled, elapsed time, rows/sec and peak RSS.
+    """
+    case, _ = CASES[name]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = case(size)
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "elapsed_s": elapsed,
+        "rows_per_s": rows / elapsed if elapsed else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_suite(sizes, max_quadratic_size=MAX_QUADRATIC_SIZE):
+    """
+    Seeds each size and runs every case on it in a fresh process.
+
+    Returns:
+        list: One result dict per (size, case).
+    """
+    results = []
+    for size in sizes:
+        reseed(size)
+        for name, (_, quadratic) in CASES.items():
+            if quadratic and size > max_quadratic_size:
+                continue
+            before = query_count()
+            result = benchmark.run_isolated(run_case, name, size)
+            if before is None:
+                result["queries"] = None
+            else:
+                # The second SHOW GLOBAL STATUS counts itself
+                result["queries"] = query_count() - before - 1
+            result.update(size=size, case=name)
+            results.append(result)
+            print(json.dumps(result), flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares results against a baseline from an earlier run.
+
+    Returns:
+        list: One message per metric that got worse by more than tolerance:
+            lower rows/sec, higher peak RSS or more queries.
+    """
+    previous = {(r["size"], r["case"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["size"], result["case"]))
+        if before is None:
+            continue
+        label = f"{result['case']} @ {result['size']}"
+        if result["rows_per_s"] < before["rows_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: {result['rows_per_s']:.0f} rows/s, "
+                f"baseline {before['rows_per_s']:.0f}")
+        if result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{label}: peak RSS {result['peak_rss_mb']:.1f} MB, "
+                f"baseline {before['peak_rss_mb']:.1f}")
+        if (result["queries"] is not None and before["queries"] is not None
+                and result["queries"] > before["queries"] * (1 + tolerance)):
+            regressions.append(
+                f"{label}: {result['queries']} queries, "
+                f"baseline {before['queries']}")
+    return regressions
+
+
+def main():
+    """Parses the command line, runs the suite and checks for regressions."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=list(DEFAULT_SIZES))
+    parser.add_argument("--database", default="ALX_prodev_bench")
+    parser.add_argument("--max-quadratic-size", type=int,
+                        default=MAX_QUADRATIC_SIZE)
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--save-baseline", help="Where to store the results")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    use_scratch_database(args.database)
+    results = run_suite(args.sizes, args.max_quadratic_size)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file),
+                                  args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
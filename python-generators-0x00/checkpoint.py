@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+"""
+Checkpoints that let long keyset scans resume after a failure.
+
+A checkpoint stores, per job name, the last user_id processed and batch
+and row counters in a local SQLite file. Generators advance it when the
+consumer asks for the next batch, i.e. once the previous batch has been
+processed, and persist it every N batches.
+"""
+import sqlite3
+import threading
+import time
+
+# File checkpoints are stored in unless another path is given
+DEFAULT_PATH = "checkpoints.db"
+
+
+class Checkpoint:
+    """
+    Progress of a named scan, persisted in SQLite.
+
+    A restarted job resumes after last_key. Batches confirmed since the last
+    write are processed again after a crash, so with every=1 at most the
+    batch in flight is repeated; processing that is idempotent, or committed
+    together with the checkpoint, then sees each row exactly once.
+
+    Attributes:
+        job (str): Name identifying the scan.
+        last_key (str): user_id of the last processed row, or None.
+        batches (int): Number of processed batches.
+        rows (int): Number of processed rows.
+        every (int): Batches between two writes to disk.
+    """
+
+    def __init__(self, job, path=DEFAULT_PATH, every=1):
+        """
+        Loads the checkpoint of job, or starts a new one.
+
+        Args:
+            job (str): Name identifying the scan.
+            path (str): SQLite file holding the checkpoints.
+            every (int): Batches between two writes to disk.
+        """
+        self.job = job
+        self.every = every
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            job TEXT PRIMARY KEY,
+            last_key TEXT,
+            batches INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """)
+        self._db.commit()
+        saved = self._db.execute(
+            "SELECT last_key, batches, rows FROM checkpoints WHERE job = ?",
+            (job,)
+        ).fetchone()
+        self.last_key, self.batches, self.rows = saved or (None, 0, 0)
+
+    def advance(self, last_key, rows):
+        """
+        Records one processed batch and writes it to disk every N batches.
+
+        Args:
+            last_key (str): user_id of the last row of the batch.
+            rows (int): Number of rows in the batch.
+        """
+        with self._lock:
+            self.last_key = last_key
+            self.batches += 1
+            self.rows += rows
+            self._unsaved += 1
+            if self._unsaved >= self.every:
+                self._save()
+
+    def flush(self):
+        """Writes any progress not yet on disk."""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def reset(self):
+        """Forgets the progress of the job, so the next run starts over."""
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoints WHERE job = ?",
+                             (self.job,))
+            self._db.commit()
+            self.last_key, self.batches, self.rows = None, 0, 0
+            self._unsaved = 0
+
+    @property
+    def connection(self):
+        """
+        Connection the checkpoint is written on. Writes made on it while
+        processing a batch are committed together with the checkpoint of
+        that batch (use every=1), so they happen exactly once.
+        """
+        return self._db
+
+    def close(self):
+        """Flushes the checkpoint and closes its database."""
+        self.flush()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _save(self):
+        """Persists the current state; caller holds the lock."""
+        self._db.execute(
+            "INSERT OR REPLACE INTO checkpoints "
+            "(job, last_key, batches, rows, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (self.job, self.last_key, self.batches, self.rows, time.time())
+        )
+        self._db.commit()
+        self._unsaved = 0
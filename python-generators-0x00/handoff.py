@@ -0,0 +1,28 @@
+#!/usr/bin/python3
+"""
+Hand-off of items from producer threads to a consuming generator.
+
+Producers put pages, exceptions and finally DONE in a bounded queue; the
+consumer sets a stop event when it goes away, so producers blocked on a
+full queue give up instead of waiting forever.
+"""
+import queue
+
+# Marks the end of a producer's items in a queue
+DONE = object()
+
+
+def put(out, item, stop):
+    """
+    Puts item in out, giving up once the consumer has stopped.
+
+    Returns:
+        bool: True if item was put, False if the consumer stopped first.
+    """
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
@@ -0,0 +1,208 @@
+#!/usr/bin/python3
+"""
+Instrumentation for the generators of this package.
+
+instrument() wraps any generator (stream_users, stream_users_in_batches,
+lazy_pagination, stream_user_ages, ...) and records how many items and
+bytes it yielded, how long it took to produce them (time spent in the
+generator, e.g. waiting on the database) versus how long the consumer kept
+them, and a latency histogram. Wrapping each stage of a pipeline shows
+which one is the bottleneck. Runs of a stage are combined by stage name
+once they finish, so wrapping a generator per request does not grow the
+registry with every request.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+
+# Stages tracked individually; further names are combined under OTHER
+MAX_STAGES = 1000
+OTHER = "<other>"
+
+_registry = {}  # name: StageMetrics of the finished runs of the stage
+_active = set()  # StageMetrics of the runs in progress
+_registry_lock = threading.Lock()
+
+
+class StageMetrics:
+    """
+    Metrics of one instrumented generator.
+
+    Attributes:
+        name (str): Name of the stage.
+        items (int): Items yielded.
+        bytes (int): Approximate payload size of the items yielded.
+        produce_s (float): Time spent inside the generator.
+        consume_s (float): Time spent by the consumer between items.
+        histogram (list): Counts of produce latencies per power of two
+            microseconds; bucket i counts latencies below 2**i us.
+        runs (int): Runs of the stage combined in these metrics.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 1
+        self.items = 0
+        self.bytes = 0
+        self.produce_s = 0.0
+        self.consume_s = 0.0
+        self.histogram = []
+        self.started = time.time()
+        self.finished = None
+
+    def record(self, produce_s, size):
+        """Records one item produced in produce_s seconds."""
+        self.items += 1
+        self.bytes += size
+        self.produce_s += produce_s
+        bucket = int(produce_s * 1e6).bit_length()
+        if bucket >= len(self.histogram):
+            self.histogram.extend([0] * (bucket + 1 - len(self.histogram)))
+        self.histogram[bucket] += 1
+
+    def merge(self, other):
+        """Adds the metrics of another finished run of the stage."""
+        self.runs += other.runs
+        self.items += other.items
+        self.bytes += other.bytes
+        self.produce_s += other.produce_s
+        self.consume_s += other.consume_s
+        if len(other.histogram) > len(self.histogram):
+            self.histogram.extend(
+                [0] * (len(other.histogram) - len(self.histogram)))
+        for bucket, count in enumerate(other.histogram):
+            self.histogram[bucket] += count
+        self.started = min(self.started, other.started)
+        self.finished = max(self.finished, other.finished)
+
+    def to_dict(self):
+        """Returns the metrics as a JSON serialisable dict."""
+        elapsed = (self.finished or time.time()) - self.started
+        return {
+            "stage": self.name,
+            "runs": self.runs,
+            "items": self.items,
+            "bytes": self.bytes,
+            "elapsed_s": elapsed,
+            "produce_s": self.produce_s,
+            "consume_s": self.consume_s,
+            "items_per_s": self.items / elapsed if elapsed else 0.0,
+            "produce_share": (self.produce_s /
+                              (self.produce_s + self.consume_s)
+                              if self.items else 0.0),
+            "latency_us_histogram": {
+                f"<{2 ** bucket}": count
+                for bucket, count in enumerate(self.histogram) if count
+            },
+            "finished": self.finished is not None,
+        }
+
+    def to_json(self):
+        """Returns the metrics as a JSON document."""
+        return json.dumps(self.to_dict())
+
+
+def instrument(generator, name=None, sizeof=None):
+    """
+    Generator that yields the items of generator while measuring them.
+
+    Args:
+        generator (iterable): Generator to wrap.
+        name (str): Stage name, defaults to the generator's name.
+        sizeof (callable): Returns the size of an item in bytes, defaults
+            to approx_size; pass False to skip size accounting.
+
+    Yields:
+        The items of generator, unchanged.
+    """
+    metrics = StageMetrics(name or getattr(generator, "__name__", "stage"))
+    with _registry_lock:
+        _active.add(metrics)
+    if sizeof is None:
+        sizeof = approx_size
+
+    iterator = iter(generator)
+    clock = time.perf_counter
+    try:
+        while True:
+            started = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            produced = clock()
+            metrics.record(produced - started, sizeof(item) if sizeof else 0)
+            yield item
+            metrics.consume_s += clock() - produced
+    finally:
+        metrics.finished = time.time()
+        _finish(metrics)
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+def _finish(metrics):
+    """Moves a finished run into the metrics of its stage."""
+    with _registry_lock:
+        _active.discard(metrics)
+        name = metrics.name
+        if name not in _registry and len(_registry) >= MAX_STAGES:
+            name = metrics.name = OTHER
+        total = _registry.get(name)
+        if total is None:
+            _registry[name] = metrics
+        else:
+            total.merge(metrics)
+
+
+def approx_size(item):
+    """Approximate payload size of a row, batch or value, in bytes."""
+    if isinstance(item, dict):
+        return sum(approx_size(value) for value in item.values())
+    if isinstance(item, (list, tuple)):
+        return sum(approx_size(value) for value in item)
+    if isinstance(item, str):
+        return len(item)
+    if isinstance(item, array):
+        return item.itemsize * len(item)
+    return sys.getsizeof(item)
+
+
+def stages():
+    """
+    Returns the combined metrics of every finished stage, then those of
+    each run still in progress.
+    """
+    with _registry_lock:
+        return list(_registry.values()) + list(_active)
+
+
+def reset():
+    """Forgets the metrics of every finished stage."""
+    with _registry_lock:
+        _registry.clear()
+
+
+def dump_metrics(stream=None):
+    """
+    Writes the metrics of every stage as JSON lines.
+
+    Args:
+        stream (file): Where to write, defaults to the file named by the
+            GENERATOR_METRICS environment variable (appended to), or stderr
+            when it is "-" or unset.
+    """
+    if stream is None:
+        path = os.getenv("GENERATOR_METRICS", "-")
+        if path != "-":
+            with open(path, "a", encoding="utf-8") as output:
+                dump_metrics(output)
+            return
+        stream = sys.stderr
+    for metrics in stages():
+        stream.write(metrics.to_json() + "\n")
+    stream.flush()
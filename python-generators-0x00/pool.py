@@ -0,0 +1,312 @@
+#!/usr/bin/python3
+"""
+Thread-safe bounded pool of MySQL connections.
+
+Every generator module draws its connections from the shared pool returned
+by get_pool(), so short-lived paging and streaming jobs reuse open
+connections instead of paying for a TCP and auth handshake each time.
+"""
+import os
+import threading
+import time
+import weakref
+
+import pymysql
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available in time."""
+
+
+def connection_params():
+    """Returns the pymysql.connect arguments configured in the environment."""
+    return {
+        "host": os.getenv("MYSQL_HOST"),
+        "port": int(os.getenv("MYSQL_PORT")),
+        "user": os.getenv("MYSQL_USER"),
+        "password": os.getenv("MYSQL_PASSWORD"),
+        "database": os.getenv("MYSQL_DB"),
+    }
+
+
+def get_pool():
+    """
+    Returns the process-wide pool, creating it on first use.
+
+    The pool is sized by MYSQL_POOL_SIZE (default 10) and closes
+    connections idle for more than MYSQL_POOL_MAX_IDLE seconds (default
+    300). A forked child process gets a pool of its own rather than sharing
+    its parent's sockets.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            params = connection_params()
+            _pool = ConnectionPool(
+                lambda: pymysql.connect(**params),
+                max_size=int(os.getenv("MYSQL_POOL_SIZE", "10")),
+                max_idle=float(os.getenv("MYSQL_POOL_MAX_IDLE", "300")),
+            )
+        return _pool
+
+
+class ConnectionPool:
+    """
+    A bounded pool of database connections.
+
+    At most max_size connections exist at once; acquire() blocks until one
+    is released when they are all in use. Idle connections are reused most
+    recently released first, pinged before reuse once they have been idle
+    for health_check_after seconds, and closed after max_idle seconds.
+
+    Attributes:
+        max_size (int): Maximum number of open connections.
+        max_idle (float): Seconds after which an idle connection is closed.
+        health_check_after (float): Idle seconds after which a connection
+            is pinged before being handed out.
+        timeout (float): Default seconds acquire() waits for a connection.
+        pid (int): Process that created the pool.
+    """
+
+    def __init__(self, connect, max_size=10, max_idle=300.0,
+                 health_check_after=30.0, timeout=30.0):
+        """
+        Args:
+            connect (callable): Opens a new database connection.
+            max_size (int): Maximum number of open connections.
+            max_idle (float): Seconds an idle connection is kept.
+            health_check_after (float): Idle seconds before a ping on reuse.
+            timeout (float): Default seconds to wait in acquire().
+        """
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._connect = connect
+        self._idle = []  # (connection, released_at), most recent last
+        self._size = 0
+        self._condition = threading.Condition()
+        self._metrics = {
+            "created": 0,
+            "reused": 0,
+            "evicted": 0,
+            "broken": 0,
+            "discarded": 0,
+            "reclaimed": 0,
+            "acquired": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_time_s": 0.0,
+            "max_wait_s": 0.0,
+        }
+
+    def acquire(self, timeout=None):
+        """
+        Checks a connection out of the pool.
+
+        Args:
+            timeout (float): Seconds to wait for a free connection,
+                defaults to the pool timeout.
+
+        Returns:
+            PooledConnection: The connection; close() returns it to the pool.
+
+        Raises:
+            PoolTimeout: If no connection was released in time.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+        evicted = []
+        with self._condition:
+            while True:
+                evicted.extend(self._evict_idle())
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    connection, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No connection available after {timeout}s")
+                waited = True
+                self._condition.wait(remaining)
+
+            waited_s = time.monotonic() - started
+            self._metrics["acquired"] += 1
+            if waited:
+                self._metrics["waits"] += 1
+                self._metrics["wait_time_s"] += waited_s
+                self._metrics["max_wait_s"] = max(
+                    self._metrics["max_wait_s"], waited_s)
+
+        for stale in evicted:
+            _close_quietly(stale)
+
+        if connection is not None and not self._is_healthy(connection,
+                                                           released_at):
+            _close_quietly(connection)
+            connection = None
+        if connection is None:
+            connection = self._open()
+        else:
+            self._count("reused")
+        return PooledConnection(self, connection)
+
+    def release(self, connection):
+        """
+        Returns a connection to the pool.
+
+        Any open transaction is rolled back first; connections that fail to
+        roll back are closed instead of being reused.
+        """
+        try:
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def discard(self, connection):
+        """
+        Closes a checked out connection instead of returning it, e.g. one
+        still receiving a result nobody will read; its slot is freed.
+        """
+        self._discard(connection, "discarded")
+
+    def close(self):
+        """Closes every idle connection."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for connection, _ in idle:
+            _close_quietly(connection)
+
+    def stats(self):
+        """Returns pool occupancy and the counters gathered so far."""
+        with self._condition:
+            stats = dict(self._metrics)
+            stats["size"] = self._size
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._size - len(self._idle)
+        waits = stats["waits"]
+        stats["avg_wait_s"] = stats["wait_time_s"] / waits if waits else 0.0
+        return stats
+
+    def _open(self):
+        """Opens a connection for a slot already reserved in _size."""
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self._count("created")
+        return connection
+
+    def _is_healthy(self, connection, released_at):
+        """Pings connections that have been idle for a while."""
+        if time.monotonic() - released_at < self.health_check_after:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            self._count("broken")
+            return False
+
+    def _evict_idle(self):
+        """Removes connections idle for too long; caller holds the lock."""
+        cutoff = time.monotonic() - self.max_idle
+        evicted = [c for c, released_at in self._idle if released_at < cutoff]
+        if evicted:
+            self._idle = [(c, released_at) for c, released_at in self._idle
+                          if released_at >= cutoff]
+            self._size -= len(evicted)
+            self._metrics["evicted"] += len(evicted)
+        return evicted
+
+    def _discard(self, connection, metric="broken"):
+        """Closes a connection and frees its slot."""
+        _close_quietly(connection)
+        with self._condition:
+            self._size -= 1
+            self._metrics[metric] += 1
+            self._condition.notify()
+
+    def _count(self, metric):
+        """Increments one of the counters."""
+        with self._condition:
+            self._metrics[metric] += 1
+
+
+class PooledConnection:
+    """
+    A connection checked out of a ConnectionPool.
+
+    It behaves like the underlying connection, except that close() (and
+    leaving a with block) hands it back to the pool. One that is garbage
+    collected without being closed has its connection closed and its slot
+    reclaimed, since nobody knows what state it was left in.
+    """
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+        self._finalizer = weakref.finalize(self, pool._discard, connection,
+                                           "reclaimed")
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise pymysql.err.InterfaceError(
+                "Connection was returned to the pool")
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Returns the connection to the pool; later calls do nothing."""
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self._finalizer.detach()
+            self._pool.release(connection)
+
+    def discard(self):
+        """
+        Closes the connection instead of returning it to the pool, without
+        reading what the server is still sending; later calls and close()
+        do nothing.
+        """
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self._finalizer.detach()
+            self._pool.discard(connection)
+
+
+def _close_quietly(connection):
+    """Closes a connection, ignoring errors from already dead sockets."""
+    try:
+        connection.close()
+    except Exception:
+        pass
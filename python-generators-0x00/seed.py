@@ -4,24 +4,43 @@ Script to set up MySQL database and populate it with sample data.
 """
 import os
 import csv
-import pymysql
+import re
+import time
 import uuid
+from decimal import Decimal, InvalidOperation
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
 from dotenv import load_dotenv
 
+pool = __import__('pool')
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Columns of the user_data table, in table order
+USER_DATA_COLUMNS = ("user_id", "name", "email", "age")
+
+# Numeric user_data columns, stored as array('d') in columnar batches
+NUMERIC_COLUMNS = ("age",)
+
+# Ages accepted when loading CSV data
+MIN_AGE = Decimal(0)
+MAX_AGE = Decimal(150)
+
+# Minimal shape of an email address accepted when loading CSV data
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+# Comparison operators accepted by compile_filters, besides "in"
+FILTER_OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+
+# Namespace of the user_ids derived from CSV rows that do not carry one
+USER_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "user_data.alx_prodev")
+
 
 def connect_db():
     """Connects to the MySQL database server"""
     try:
-        connection = pymysql.connect(
-            host=os.getenv("MYSQL_HOST"),
-            port=int(os.getenv("MYSQL_PORT")),
-            user=os.getenv("MYSQL_USER"),
-            password=os.getenv("MYSQL_PASSWORD"),
-            database=os.getenv("MYSQL_DB")
-        )
+        connection = pool.get_pool().acquire()
         print("Successfully connected to MySQL server")
         return connection
     except Exception as e:
@@ -40,15 +59,15 @@ def create_database(connection):
 
 
 def connect_to_prodev():
-    """Connects to the ALX_prodev database in MySQL"""
+    """
+    Connects to the ALX_prodev database of the configured backend.
+
+    With MySQL the connection comes from the shared pool; closing it hands
+    it back. DB_BACKEND=sqlite opens the SQLITE_PATH file instead (see
+    backends.py).
+    """
     try:
-        connection = pymysql.connect(
-            host=os.getenv("MYSQL_HOST"),
-            port=int(os.getenv("MYSQL_PORT")),
-            user=os.getenv("MYSQL_USER"),
-            password=os.getenv("MYSQL_PASSWORD"),
-            database=os.getenv("MYSQL_DB")
-            )
+        connection = __import__('backends').get_backend().connect()
         print("Successfully connected to ALX_prodev database")
         return connection
     except Exception as e:
@@ -57,55 +76,91 @@ def connect_to_prodev():
 
 
 def create_table(connection):
-    """Creates a table user_data if it does not exist with the required fields"""
+    """
+    Creates a table user_data if it does not exist with the required fields,
+    in the dialect of the configured backend (see backends.py)
+    """
     try:
-        cursor = connection.cursor()
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_data (
-            user_id CHAR(36) PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            email VARCHAR(255) NOT NULL,
-            age DECIMAL(5,2) NOT NULL,
-            INDEX (user_id)
-        )
-        """)
+        __import__('backends').get_backend().create_schema(connection)
         print("Table 'user_data' created or already exists")
     except Exception as e:
         print(f"Error creating table: {e}")
 
 
+def select_columns(columns=None):
+    """
+    Builds the column list of a SELECT on user_data.
+
+    Args:
+        columns (iterable): Names of the columns to project,
+            or None for every column.
+
+    Returns:
+        str: A comma separated column list safe to put in the query.
+
+    Raises:
+        ValueError: If a column is not part of user_data.
+    """
+    if columns is None:
+        return "*"
+    columns = tuple(columns)
+    if not columns:
+        raise ValueError("At least one column must be selected")
+    unknown = [c for c in columns if c not in USER_DATA_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown user_data columns: {unknown}")
+    return ", ".join(columns)
+
+
+def compile_filters(filters=None):
+    """
+    Compiles a declarative filter spec into a SQL WHERE condition.
+
+    Args:
+        filters (iterable): (column, operator, value) triples that must all
+            hold, e.g. [("age", ">", 25)]. Operators are =, !=, <, <=, >,
+            >= and "in", whose value is a sequence.
+
+    Returns:
+        tuple: The condition (without WHERE, "" when there are no filters)
+            and the list of parameters to bind to it.
+
+    Raises:
+        ValueError: On unknown columns or operators.
+    """
+    conditions = []
+    params = []
+    for column, operator, value in filters or ():
+        select_columns([column])
+        operator = operator.lower()
+        if operator == "in":
+            values = list(value)
+            if not values:
+                conditions.append("FALSE")
+                continue
+            placeholders = ", ".join(["%s"] * len(values))
+            conditions.append(f"{column} IN ({placeholders})")
+            params.extend(values)
+        elif operator in FILTER_OPERATORS:
+            conditions.append(f"{column} {operator} %s")
+            params.append(value)
+        else:
+            raise ValueError(f"Unsupported filter operator: {operator!r}")
+    return " AND ".join(conditions), params
+
+
 def insert_data(connection, data):
     """
     Inserts data in the database if it does not exist.
     'data' can be either a dictionary or a path to a CSV file.
     """
-    try:
-        # Check if data is a string (filepath)
-        if isinstance(data, str):
-            load_csv_data(connection, data)
-            return
-
-        # If data is a dictionary, proceed with individual insert
-        cursor = connection.cursor()
+    # Check if data is a string (filepath)
+    if isinstance(data, str):
+        bulk_load_csv_data(connection, data)
+        return
 
-        # First check if the user_id already exists
-        query = "SELECT user_id FROM user_data WHERE user_id = %s"
-        cursor.execute(query, (data['user_id'],))
-        result = cursor.fetchone()
-
-        if result is None:  # User does not exist, insert the data
-            insert_query = """
-            INSERT INTO user_data (user_id, name, email, age)
-            VALUES (%s, %s, %s, %s)
-            """
-            values = (data['user_id'], data['name'], data['email'], data['age'])
-            cursor.execute(insert_query, values)
-            connection.commit()
-            print(f"Data for {data['name']} inserted successfully")
-        else:
-            print(f"User with ID {data['user_id']} already exists. Skipping.")
-    except Exception as e:
-        print(f"Error inserting data: {e}")
+    # If data is a dictionary, proceed with individual insert
+    insert_row(connection, data)
 
 
 def load_csv_data(connection, file_path):
@@ -121,33 +176,327 @@ def load_csv_data(connection, file_path):
                 # Insert the data
                 insert_row(connection, row)
 
+    except FileNotFoundError:
+        print(f"File {file_path} not found.")
     except Exception as e:
         print(f"Error loading CSV data: {e}")
+
+
+def bulk_load_csv_data(connection, file_path, batch_size=1000,
+                       on_duplicate="ignore", report_every=100_000):
+    """
+    Load data from a CSV file in batches instead of row by row.
+
+    Each batch is sent with a single executemany (a multi-row INSERT) and
+    committed once, so the cost per row is no longer a round trip and an
+    fsync.
+
+    Args:
+        connection: An open connection to ALX_prodev.
+        file_path (str): Path of the CSV file to load.
+        batch_size (int): Rows per INSERT and per commit.
+        on_duplicate (str): "ignore" keeps existing rows,
+            "update" overwrites them with the CSV values.
+        report_every (int): Print progress every this many rows.
+
+    Rows failing validation are written to <file_path>.rejected.csv.
+
+    Returns:
+        int: Number of CSV rows sent to the database.
+    """
+    _check_on_duplicate(on_duplicate)
+    loaded = 0
+    try:
+        with open(file_path, mode='r', encoding='utf-8') as csv_file, \
+                RejectedRows(f"{file_path}.rejected.csv") as rejects:
+            loaded = load_rows(connection, csv.DictReader(csv_file),
+                               batch_size, on_duplicate, report_every,
+                               rejects)
     except FileNotFoundError:
         print(f"File {file_path} not found.")
+    except Exception as e:
+        connection.rollback()
+        print(f"Error bulk loading CSV data: {e}")
+    return loaded
 
 
-def insert_row(connection, data):
-    """Insert a single row of data"""
+def parallel_load_csv_data(file_path, workers=None, batch_size=1000,
+                           on_duplicate="ignore"):
+    """
+    Load data from a CSV file with several processes.
+
+    The file is split into byte ranges that start and end on line
+    boundaries; each worker process parses its own range and loads it in
+    batches over its own connection. user_ids are derived from the row
+    contents, so loading the same file twice leaves the table unchanged.
+    Quoted fields must not contain line breaks. Rows failing validation are
+    written to one <file_path>.rejected-<N>.csv file per partition.
+
+    Args:
+        file_path (str): Path of the CSV file to load.
+        workers (int): Number of worker processes, defaults to the CPU count.
+        batch_size (int): Rows per INSERT and per commit in each worker.
+        on_duplicate (str): "ignore" or "update", as in bulk_load_csv_data.
+
+    Returns:
+        int: Number of CSV rows sent to the database by all workers.
+    """
+    _check_on_duplicate(on_duplicate)
+    workers = workers or os.cpu_count() or 1
+    loaded = 0
+    start = time.perf_counter()
     try:
-        cursor = connection.cursor()
+        fieldnames, ranges = partition_csv(file_path, workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_load_partition, file_path, fieldnames,
+                                begin, end, batch_size, on_duplicate,
+                                f"{file_path}.rejected-{index}.csv")
+                for index, (begin, end) in enumerate(ranges)
+            ]
+            for future in as_completed(futures):
+                loaded += future.result()
+        _report_progress(loaded, start)
+    except FileNotFoundError:
+        print(f"File {file_path} not found.")
+    except Exception as e:
+        print(f"Error loading CSV data in parallel: {e}")
+    return loaded
 
-        # First check if the user_id already exists
-        query = "SELECT user_id FROM user_data WHERE user_id = %s"
-        cursor.execute(query, (data['user_id'],))
-        result = cursor.fetchone()
-
-        if result is None:  # User does not exist, insert the data
-            insert_query = """
-            INSERT INTO user_data (user_id, name, email, age)
-            VALUES (%s, %s, %s, %s)
-            """
-            values = (data['user_id'], data['name'], data['email'], data['age'])
-            cursor.execute(insert_query, values)
+
+def partition_csv(file_path, partitions):
+    """
+    Split the body of a CSV file into byte ranges on line boundaries.
+
+    Returns:
+        tuple: The header field names and a list of (start, end) offsets
+            covering every data line exactly once.
+    """
+    with open(file_path, mode='rb') as csv_file:
+        header = csv_file.readline()
+        body_start = csv_file.tell()
+        size = os.fstat(csv_file.fileno()).st_size
+
+        bounds = [body_start]
+        for i in range(1, partitions):
+            target = body_start + (size - body_start) * i // partitions
+            if target <= bounds[-1]:
+                continue
+            csv_file.seek(target)
+            csv_file.readline()  # move to the start of the next line
+            bounds.append(min(csv_file.tell(), size))
+        bounds.append(size)
+
+    fieldnames = next(csv.reader([header.decode('utf-8-sig')]))
+    ranges = [(begin, end) for begin, end in zip(bounds, bounds[1:])
+              if begin < end]
+    return fieldnames, ranges
+
+
+def _load_partition(file_path, fieldnames, begin, end, batch_size,
+                    on_duplicate, rejects_path):
+    """Worker: load the CSV lines between two byte offsets."""
+    connection = connect_to_prodev()
+    if connection is None:
+        raise ConnectionError("Worker could not connect to ALX_prodev")
+    try:
+        reader = csv.DictReader(_read_lines(file_path, begin, end),
+                                fieldnames=fieldnames)
+        with RejectedRows(rejects_path) as rejects:
+            return load_rows(connection, reader, batch_size, on_duplicate,
+                             rejects=rejects)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def _read_lines(file_path, begin, end):
+    """Yield the decoded lines of a file between two byte offsets."""
+    with open(file_path, mode='rb') as csv_file:
+        csv_file.seek(begin)
+        position = begin
+        for line in csv_file:
+            if position >= end:
+                break
+            position += len(line)
+            yield line.decode('utf-8')
+
+
+def load_rows(connection, rows, batch_size=1000, on_duplicate="ignore",
+              report_every=None, rejects=None):
+    """
+    Insert rows from an iterable of dicts, one bulk insert per batch.
+
+    Inserts go through the configured backend (see backends.py): a
+    multi-row executemany on MySQL, a prepared-statement executemany on
+    SQLite.
+
+    Each batch is first checked by validate_chunk: invalid and duplicate
+    rows go to rejects instead of the database and, in "ignore" mode, rows
+    whose user_id already exists are skipped before being sent.
+
+    Returns:
+        int: Number of rows sent to the database.
+    """
+    backend = __import__('backends').get_backend()
+    lookup = None
+    if on_duplicate == "ignore":
+        def lookup(user_ids):
+            return backend.existing_user_ids(connection, user_ids)
+
+    loaded = 0
+    start = time.perf_counter()
+    for batch in iter(lambda: list(islice(rows, batch_size)), []):
+        valid, rejected, _ = validate_chunk(batch, lookup)
+        if rejects is not None:
+            rejects.write(rejected)
+        if valid:
+            backend.bulk_insert(connection, valid, on_duplicate)
             connection.commit()
-            print(f"Data for {data['name']} inserted successfully")
+
+        loaded += len(valid)
+        if report_every and loaded % report_every < len(valid):
+            _report_progress(loaded, start)
+    if report_every:
+        _report_progress(loaded, start)
+    return loaded
+
+
+def validate_chunk(rows, lookup=None):
+    """
+    Validate and deduplicate a chunk of CSV rows before loading it.
+
+    Each check runs over the whole chunk at once: ages are parsed and range
+    checked, emails matched, duplicate user_ids inside the chunk dropped
+    through a set and, when lookup is given, the user_ids already in
+    user_data looked up with a single call for the chunk (see
+    backends.Backend.existing_user_ids, a single SELECT ... IN).
+
+    Valid rows get their user_id filled in and their age as a Decimal.
+
+    Returns:
+        tuple: The valid rows, the rejected rows as (row, reason) pairs,
+            and the number of rows skipped because they already exist.
+    """
+    ages = [_parse_age(row.get('age')) for row in rows]
+    emails = [bool(EMAIL_PATTERN.match(row.get('email') or '')) for row in rows]
+    names = [bool((row.get('name') or '').strip()) for row in rows]
+
+    valid = []
+    rejected = []
+    seen = set()
+    for row, age, email_ok, name_ok in zip(rows, ages, emails, names):
+        if not name_ok:
+            rejected.append((row, "missing name"))
+        elif not email_ok:
+            rejected.append((row, "invalid email"))
+        elif age is None:
+            rejected.append((row, "invalid age"))
         else:
+            row['user_id'] = row.get('user_id') or row_user_id(row)
+            if row['user_id'] in seen:
+                rejected.append((row, "duplicate user_id"))
+                continue
+            seen.add(row['user_id'])
+            row['age'] = age
+            valid.append(row)
+
+    skipped = 0
+    if lookup is not None and seen:
+        existing = lookup(seen)
+        if existing:
+            valid = [row for row in valid if row['user_id'] not in existing]
+            skipped = len(existing)
+    return valid, rejected, skipped
+
+
+def _parse_age(value):
+    """Parse an age into a Decimal, or None if it is not a valid age."""
+    try:
+        age = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    if not age.is_finite() or not MIN_AGE <= age <= MAX_AGE:
+        return None
+    return age
+
+
+class RejectedRows:
+    """
+    Sidecar CSV file collecting the rows refused while loading.
+
+    The file is only created when the first row is rejected; each line is
+    the original row plus the reason it was rejected.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, rejected):
+        """Append (row, reason) pairs to the file."""
+        for row, reason in rejected:
+            if self._writer is None:
+                self._file = open(self.path, mode='w', newline='',
+                                  encoding='utf-8')
+                fieldnames = [key for key in row if key is not None]
+                self._writer = csv.DictWriter(
+                    self._file, fieldnames=fieldnames + ['reason'],
+                    extrasaction='ignore')
+                self._writer.writeheader()
+            self._writer.writerow({**row, 'reason': reason})
+            self.count += 1
+
+    def close(self):
+        """Close the file and report how many rows were rejected."""
+        if self._file is not None:
+            self._file.close()
+            print(f"{self.count} rejected rows written to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def row_user_id(row):
+    """Deterministic user_id for a CSV row that does not carry one."""
+    key = "\x1f".join((row['name'], row['email'], str(row['age'])))
+    return str(uuid.uuid5(USER_ID_NAMESPACE, key))
+
+
+def _check_on_duplicate(on_duplicate):
+    """Reject unknown duplicate handling modes before touching the database."""
+    if on_duplicate not in ("ignore", "update"):
+        raise ValueError(f"on_duplicate must be 'ignore' or 'update', "
+                         f"not {on_duplicate!r}")
+
+
+def _report_progress(loaded, start):
+    """Print how many rows were loaded so far and at what rate."""
+    elapsed = time.perf_counter() - start
+    rate = loaded / elapsed if elapsed else 0.0
+    print(f"{loaded} rows loaded ({rate:.0f} rows/sec)")
+
+
+def insert_row(connection, data):
+    """Insert a single row of data through the configured backend"""
+    try:
+        backend = __import__('backends').get_backend()
+
+        # First check if the user_id already exists
+        if backend.existing_user_ids(connection, [data['user_id']]):
             print(f"User with ID {data['user_id']} already exists. Skipping.")
+            return
+
+        backend.bulk_insert(connection, [data])
+        connection.commit()
+        print(f"Data for {data['name']} inserted successfully")
     except Exception as e:
         print(f"Error inserting data: {e}")
 
@@ -164,16 +513,14 @@ def stream_rows_generator(connection=None, query="SELECT * FROM user_data"):
         return
 
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query)
-
-        # Yield rows one by one
-        for row in cursor:
-            yield row
+        # Yield rows one by one as the backend reads them
+        # A connection opened here may be discarded when the consumer stops
+        # early; one passed in is the caller's and is drained instead
+        yield from __import__('backends').get_backend().stream(
+            connection, query, discard_early=should_close_connection)
 
     except Exception as e:
         print(f"Error streaming data: {e}")
     finally:
-        if should_close_connection and connection.is_connected():
-            cursor.close()
+        if should_close_connection:
             connection.close()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""Tests the `aggregate` module.
+"""
+import unittest
+
+aggregate = __import__('aggregate')
+
+
+class TestSqlAggregator(unittest.TestCase):
+    """Tests the columns SqlAggregator accepts."""
+
+    def test_non_numeric_column(self) -> None:
+        """Tests that a column outside NUMERIC_COLUMNS is refused."""
+        for column in ("email", "name", "age) FROM user_data; --"):
+            with self.assertRaisesRegex(ValueError, "numeric"):
+                aggregate.SqlAggregator(column)
+
+    def test_numeric_column(self) -> None:
+        """Tests that a numeric column is accepted."""
+        self.assertEqual(aggregate.SqlAggregator("age").column, "age")
+
+
+if __name__ == "__main__":
+    unittest.main()
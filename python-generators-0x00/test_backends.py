@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Tests the `backends` module.
+"""
+import unittest
+
+backends = __import__('backends')
+pool = __import__('pool')
+
+
+class StubCursor:
+    """Server-side cursor over 10 rows that records being closed."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.fetched = 0
+
+    def execute(self, query, params):
+        pass
+
+    def fetchmany(self, size):
+        rows = [{"row": i} for i in range(self.fetched,
+                                          min(self.fetched + size, 10))]
+        self.fetched += len(rows)
+        return rows
+
+    def close(self):
+        self.connection.events.append("cursor closed")
+
+
+class StubConnection:
+    """Stands in for a pymysql connection."""
+
+    def __init__(self):
+        self.events = []
+
+    def cursor(self, cursorclass=None):
+        return StubCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.events.append("connection closed")
+
+
+class TestMySQLStream(unittest.TestCase):
+    """Tests how an unbuffered MySQL stream closed early ends."""
+
+    def setUp(self) -> None:
+        self.pool = pool.ConnectionPool(StubConnection, max_size=1)
+        self.connection = self.pool.acquire()
+        self.events = self.connection.events
+
+    def stop_early(self, **kwargs):
+        rows = backends.MySQLBackend().stream(self.connection, "query",
+                                              chunk_size=2, **kwargs)
+        next(rows)
+        rows.close()
+
+    def test_borrowed_connection_kept(self) -> None:
+        """Tests that the caller's connection is drained, not discarded."""
+        self.stop_early()
+        self.assertEqual(self.events, ["cursor closed"])
+        self.assertIsNotNone(self.connection.cursor())
+        self.connection.close()
+        self.assertEqual(self.pool.stats()["idle"], 1)
+
+    def test_discard_early(self) -> None:
+        """Tests that an owned connection is discarded without draining."""
+        self.stop_early(discard_early=True)
+        self.assertEqual(self.events, ["connection closed"])
+        self.assertEqual(self.pool.stats()["discarded"], 1)
+
+    def test_finished_stream(self) -> None:
+        """Tests that a stream read to the end closes its cursor."""
+        rows = backends.MySQLBackend().stream(
+            self.connection, "query", chunk_size=3, discard_early=True)
+        self.assertEqual(len(list(rows)), 10)
+        self.assertEqual(self.events, ["cursor closed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Tests resuming a checkpointed scan after its process was killed.
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+USERS = 100
+BATCH_SIZE = 10
+
+# Records each row in the checkpoint database, in the transaction that
+# advances the checkpoint past its batch, and prints one line per batch
+WORKER = f"""
+import sys
+import time
+from checkpoint import Checkpoint
+
+stream_users_in_batches = __import__(
+    '1-batch_processing').stream_users_in_batches
+
+with Checkpoint("test", path=sys.argv[1]) as checkpoint:
+    db = checkpoint.connection
+    db.execute("CREATE TABLE IF NOT EXISTS processed (user_id TEXT)")
+    db.commit()
+    for batch in stream_users_in_batches({BATCH_SIZE},
+                                         checkpoint=checkpoint):
+        db.executemany("INSERT INTO processed VALUES (?)",
+                       [(user["user_id"],) for user in batch])
+        print(len(batch), flush=True)
+        time.sleep(0.05)
+"""
+
+
+class TestResume(unittest.TestCase):
+    """Tests that a killed and resumed scan processes each row once."""
+
+    def setUp(self) -> None:
+        """Seeds a scratch SQLite user_data table."""
+        self.directory = tempfile.TemporaryDirectory()
+        users = os.path.join(self.directory.name, "ALX_prodev.db")
+        self.checkpoints = os.path.join(self.directory.name, "checkpoints.db")
+        self.env = dict(os.environ, DB_BACKEND="sqlite", SQLITE_PATH=users,
+                        PYTHONPATH=HERE)
+        db = sqlite3.connect(users)
+        db.execute("CREATE TABLE user_data (user_id CHAR(36) PRIMARY KEY, "
+                   "name VARCHAR(255), email VARCHAR(255), age DECIMAL(5,2))")
+        db.executemany("INSERT INTO user_data VALUES (?, ?, ?, ?)",
+                       [(f"{i:036d}", "name", "a@b.co", 30)
+                        for i in range(USERS)])
+        db.commit()
+        db.close()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def worker(self):
+        return subprocess.Popen(
+            [sys.executable, "-c", WORKER, self.checkpoints], env=self.env,
+            cwd=self.directory.name, stdout=subprocess.PIPE, text=True)
+
+    def test_kill_and_resume(self) -> None:
+        """Tests that killing after 3 batches loses and repeats nothing."""
+        first = self.worker()
+        for _ in range(3):
+            self.assertTrue(first.stdout.readline())
+        first.kill()
+        first.communicate(timeout=20)
+
+        db = sqlite3.connect(self.checkpoints)
+        done = db.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+        db.close()
+        self.assertGreaterEqual(done, 2 * BATCH_SIZE)
+        self.assertLess(done, USERS)
+
+        second = self.worker()
+        second.communicate(timeout=20)
+        self.assertEqual(second.returncode, 0)
+
+        db = sqlite3.connect(self.checkpoints)
+        total, distinct = db.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT user_id) FROM processed"
+        ).fetchone()
+        db.close()
+        self.assertEqual((total, distinct), (USERS, USERS))
+
+
+if __name__ == "__main__":
+    unittest.main()
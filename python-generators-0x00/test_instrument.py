@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Tests the `instrument` module.
+"""
+import unittest
+from unittest.mock import patch
+
+instrument = __import__('instrument')
+
+
+class TestRegistry(unittest.TestCase):
+    """Tests that the stage registry stays bounded."""
+
+    def setUp(self) -> None:
+        instrument.reset()
+
+    def tearDown(self) -> None:
+        instrument.reset()
+
+    def test_runs_combined(self) -> None:
+        """Tests that repeated runs of a stage share one entry."""
+        for _ in range(1000):
+            list(instrument.instrument(iter(range(3)), "request"))
+        stage, = instrument.stages()
+        self.assertEqual((stage.runs, stage.items), (1000, 3000))
+        self.assertEqual(sum(stage.histogram), 3000)
+
+    def test_run_in_progress(self) -> None:
+        """Tests that a run is listed on its own until it finishes."""
+        list(instrument.instrument(iter(range(2)), "request"))
+        running = instrument.instrument(iter(range(2)), "request")
+        next(running)
+        self.assertEqual([stage.runs for stage in instrument.stages()],
+                         [1, 1])
+        running.close()
+        stage, = instrument.stages()
+        self.assertEqual((stage.runs, stage.items), (2, 3))
+
+    def test_names_bounded(self) -> None:
+        """Tests that names past MAX_STAGES are combined under OTHER."""
+        with patch.object(instrument, "MAX_STAGES", 2):
+            for index in range(5):
+                list(instrument.instrument(iter(range(1)), f"stage-{index}"))
+        names = [stage.name for stage in instrument.stages()]
+        self.assertEqual(names, ["stage-0", "stage-1", instrument.OTHER])
+        self.assertEqual(instrument.stages()[-1].runs, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
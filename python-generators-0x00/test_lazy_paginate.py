@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Tests the `2-lazy_paginate` module.
+"""
+import itertools
+import threading
+import unittest
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+
+class TestPrefetchPages(unittest.TestCase):
+    """Tests the background thread fetching pages ahead."""
+
+    def setUp(self) -> None:
+        self.closed = []
+
+    def pages(self, fail_after=None):
+        """Numbered pages, failing after fail_after of them if given."""
+        try:
+            for number in itertools.count():
+                if number == fail_after:
+                    raise RuntimeError("fetch failed")
+                yield [number]
+        finally:
+            self.closed.append(True)
+
+    def assert_stopped(self):
+        self.assertEqual(self.closed, [True])
+        self.assertNotIn("lazy_pagination-prefetch",
+                         [thread.name for thread in threading.enumerate()])
+
+    def test_stop_early(self) -> None:
+        """Tests that stopping through islice joins the thread."""
+        prefetched = lazy_paginate.prefetch_pages(self.pages(), 2)
+        self.assertEqual(list(itertools.islice(prefetched, 3)),
+                         [[0], [1], [2]])
+        prefetched.close()
+        self.assert_stopped()
+
+    def test_fetch_error(self) -> None:
+        """Tests that a failed fetch is raised to the consumer."""
+        prefetched = lazy_paginate.prefetch_pages(self.pages(fail_after=2),
+                                                  2)
+        with self.assertRaisesRegex(RuntimeError, "fetch failed"):
+            for _ in prefetched:
+                pass
+        self.assert_stopped()
+
+
+if __name__ == "__main__":
+    unittest.main()
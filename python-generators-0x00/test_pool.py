@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Tests the `pool` module.
+"""
+import gc
+import os
+import time
+import threading
+import unittest
+from unittest.mock import patch
+
+pool = __import__('pool')
+lazy_paginate = __import__('2-lazy_paginate')
+
+
+class StubConnection:
+    """Stands in for a pymysql connection."""
+
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.closed = False
+
+    def rollback(self):
+        if self.broken:
+            raise ConnectionError("lost connection")
+
+    def ping(self, reconnect=False):
+        if self.broken:
+            raise ConnectionError("lost connection")
+
+    def cursor(self, cursorclass=None):
+        raise ConnectionError("query failed")
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Tests checking connections out of and back into a pool."""
+
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            self.opened.append(StubConnection())
+            return self.opened[-1]
+        return pool.ConnectionPool(connect, **kwargs)
+
+    def test_reuse_most_recent(self) -> None:
+        """Tests that the most recently released connection is reused."""
+        connections = self.make_pool(max_size=2)
+        first, second = connections.acquire(), connections.acquire()
+        first.close()
+        second.close()
+        with connections.acquire() as again:
+            self.assertIs(again._connection, self.opened[1])
+        self.assertEqual(connections.stats()["created"], 2)
+        self.assertEqual(connections.stats()["reused"], 1)
+
+    def test_timeout(self) -> None:
+        """Tests that acquire gives up when every connection is in use."""
+        connections = self.make_pool(max_size=1)
+        held = connections.acquire()
+        with self.assertRaises(pool.PoolTimeout):
+            connections.acquire(timeout=0.05)
+        self.assertEqual(connections.stats()["timeouts"], 1)
+        held.close()
+
+    def test_waiter_woken(self) -> None:
+        """Tests that a waiting acquire gets the connection released."""
+        connections = self.make_pool(max_size=1)
+        held = connections.acquire()
+        acquired = []
+        waiter = threading.Thread(
+            target=lambda: acquired.append(connections.acquire(timeout=5)))
+        waiter.start()
+        time.sleep(0.05)
+        held.close()
+        waiter.join(2)
+        self.assertEqual(len(acquired), 1)
+        self.assertEqual(connections.stats()["waits"], 1)
+        acquired[0].close()
+
+    def test_evict_idle(self) -> None:
+        """Tests that connections idle past max_idle are closed."""
+        connections = self.make_pool(max_size=1, max_idle=0.01)
+        connections.acquire().close()
+        time.sleep(0.02)
+        connections.acquire().close()
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(connections.stats()["evicted"], 1)
+
+    def test_broken_on_release(self) -> None:
+        """Tests that a connection failing to roll back is dropped."""
+        connections = self.make_pool(max_size=1)
+        held = connections.acquire()
+        self.opened[0].broken = True
+        held.close()
+        self.assertTrue(self.opened[0].closed)
+        stats = connections.stats()
+        self.assertEqual((stats["broken"], stats["size"]), (1, 0))
+
+    def test_health_check(self) -> None:
+        """Tests that a stale idle connection failing a ping is replaced."""
+        connections = self.make_pool(max_size=1, health_check_after=0)
+        connections.acquire().close()
+        self.opened[0].broken = True
+        with connections.acquire() as fresh:
+            self.assertIs(fresh._connection, self.opened[1])
+
+    def test_abandoned_connection_reclaimed(self) -> None:
+        """Tests that a connection dropped without close() frees its slot."""
+        connections = self.make_pool(max_size=1)
+        connections.acquire()
+        gc.collect()
+        with connections.acquire(timeout=0.05):
+            pass
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(connections.stats()["reclaimed"], 1)
+
+
+class TestPaginateUsers(unittest.TestCase):
+    """Tests that failed page queries give their connection back."""
+
+    def test_failed_pages_release_connections(self) -> None:
+        """Tests that more failures than connections do not time out."""
+        stub = pool.ConnectionPool(StubConnection, max_size=2, timeout=0.1)
+        with patch.dict(os.environ, DB_BACKEND="mysql"), \
+                patch.object(pool, "_pool", stub):
+            for _ in range(3):
+                with self.assertRaisesRegex(ConnectionError, "query failed"):
+                    lazy_paginate.paginate_users(10, 0)
+        self.assertEqual(stub.stats()["in_use"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()